@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+adaptive_eval.py
+
+自适应评测：按分层抽样顺序分轮打分，指标的 bootstrap 置信区间足够窄时提前停止。
+
+  plan  根据 text_prompt 生成分层抽样顺序 <test_name>.order.json，
+        tts_from_test_jsonl.py --order_file 可按此顺序只合成前 N 条，节省 TTS/推理开销。
+  run   对某个 model_answer/<model>/<dataset> 目录按该顺序每轮取 ROUND_SIZE 行，
+        依次跑 audio_check / WER / text_metrics / GPT / UTMOS / latency（复用 batch_score.patch_and_run），
+        结果追加到 manifest_scored.jsonl；当 METRICS 中每个指标的 CI 宽度都不超过目标时停止。
+        已在 manifest_scored.jsonl 中打过分的行直接复用，可中断后续跑。
+        manifest 只含已合成的前缀时，层权重仍按 text_prompt 全集计算；前缀用完仍未达标时
+        stop_reason=needs_more_rows（final=false），需要用更大的 --max_rows 合成更多行后再 run。
+
+无偏性：
+  - 顺序为比例分层：每层内随机打乱，第 k 个元素的排序键为 (k + u_h) / N_h（u_h 为层内随机偏移），
+    因此任意前缀中各层行数都近似与总体占比成正比；
+  - 估计量为后分层加权均值 Σ w_h · mean_h（w_h 为该层在全集中的占比，不在已观测层上重新归一化），
+    bootstrap 在层内重抽样；
+  - 已观测行数少于 MIN_STRATUM_ROWS 的层（含尚未观测到的层）合并为一个混合层，权重为这些层的占比之和，
+    避免单行层不贡献方差导致 CI 偏窄、提前停止；合并后仍有层不足 2 行时退回不分层 bootstrap。
+
+Usage:
+    python adaptive_eval.py plan truthfulqa_truthful_qa_generation_validation
+    python adaptive_eval.py run --dataset_dir ../model_answer/SLAM-Omni/truthfulqa_truthful_qa_generation_validation
+
+text_prompt 目录默认取仓库根目录下的 text_prompt/（与当前工作目录无关），可用 --text_prompt_dir 覆盖。
+"""
+
+import os
+import json
+import argparse
+from collections import defaultdict
+import numpy as np
+
+import batch_score
+
+TEXT_PROMPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "text_prompt")
+
+# 分层字段（text_prompt 原始行中的键）；未配置的数据集不分层
+STRATA_KEYS = {
+    "truthfulqa_truthful_qa_generation_validation": ["category"],
+}
+
+METRICS = ["wer", "chatgpt_score", "utmos_mos"]
+# 95% CI 宽度目标（上界 - 下界）
+CI_WIDTH_TARGET = {"wer": 0.05, "chatgpt_score": 0.4, "utmos_mos": 0.1}
+CI_LEVEL = 0.95
+N_BOOTSTRAP = 2000
+ROUND_SIZE = 40
+MIN_ROWS = 40
+MIN_STRATUM_ROWS = 5       # 已观测行数少于该值的层合并为混合层
+POOLED_STRATUM = "__pooled__"
+SEED = 0
+
+ROUND_MANIFEST = "adaptive_round.jsonl"
+ROUND_SCORED = "adaptive_round_scored.jsonl"
+REPORT_NAME = "adaptive_report.json"
+
+
+def read_jsonl(path):
+    rows = []
+    if not os.path.exists(path):
+        return rows
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return rows
+
+
+def load_strata(test_name):
+    """返回 {id: stratum}；未配置分层的数据集返回空 dict（全部视为同一层）。"""
+    keys = STRATA_KEYS.get(test_name)
+    if not keys:
+        return {}
+    path = prompt_path(test_name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"STRATA_KEYS 配置了 {test_name}，但找不到 text_prompt 文件: {path}")
+    strata = {}
+    for row in read_jsonl(path):
+        if "id" in row:
+            strata[row["id"]] = "|".join(str(row.get(k)) for k in keys)
+    return strata
+
+
+def stratified_order(ids, strata, seed=SEED):
+    rng = np.random.default_rng(seed)
+    groups = defaultdict(list)
+    for i in ids:
+        groups[strata.get(i, "")].append(i)
+    keyed = []
+    for name in sorted(groups):
+        members = groups[name]
+        rng.shuffle(members)
+        offset = rng.random()
+        n = len(members)
+        keyed.extend(((k + offset) / n, i) for k, i in enumerate(members))
+    keyed.sort()
+    return [i for _, i in keyed]
+
+
+def prompt_path(test_name):
+    return os.path.join(TEXT_PROMPT_DIR, f"{test_name}.jsonl")
+
+
+def load_dataset_ids(test_name):
+    """text_prompt 中的全部 id（数据集总体）；文件不存在时返回空列表。"""
+    return [row["id"] for row in read_jsonl(prompt_path(test_name)) if "id" in row]
+
+
+def order_path(test_name):
+    return os.path.join(TEXT_PROMPT_DIR, f"{test_name}.order.json")
+
+
+def plan(test_name):
+    if not os.path.exists(prompt_path(test_name)):
+        raise FileNotFoundError(f"text_prompt 文件不存在: {prompt_path(test_name)}")
+    ids = load_dataset_ids(test_name)
+    strata = load_strata(test_name)
+    order = stratified_order(ids, strata)
+    with open(order_path(test_name), "w", encoding="utf-8") as f:
+        json.dump({"test_name": test_name, "seed": SEED, "strata_keys": STRATA_KEYS.get(test_name), "order": order}, f)
+    print(f"[DONE] {len(order)} ids, {len(set(strata.values())) or 1} strata -> {order_path(test_name)}")
+
+
+def stratified_ci(values, strata, weights, rng):
+    """values: [(id, v)]；返回 (estimate, lo, hi)。
+
+    weights 为各层在全集中的占比（和为 1）。观测不足 MIN_STRATUM_ROWS 的层与未观测层合并为混合层，
+    其权重为这些层的占比之和；合并后仍有层少于 2 行时整体退回不分层 bootstrap。
+    """
+    observed = defaultdict(list)
+    for i, v in values:
+        observed[strata.get(i, "")].append(v)
+
+    by_stratum = defaultdict(list)
+    w_by_stratum = defaultdict(float)
+    for h, wh in weights.items():
+        name = h if len(observed.get(h, ())) >= MIN_STRATUM_ROWS else POOLED_STRATUM
+        w_by_stratum[name] += wh
+        by_stratum[name].extend(observed.get(h, ()))
+    for h, vs in observed.items():
+        if h not in weights:  # 不在全集里的层（理论上不会出现）并入混合层，不带权重
+            by_stratum[POOLED_STRATUM].extend(vs)
+
+    if any(len(by_stratum[h]) < 2 for h in w_by_stratum if w_by_stratum[h] > 0):
+        by_stratum = {"": [v for _, v in values]}
+        w_by_stratum = {"": 1.0}
+    names = sorted(h for h in by_stratum if by_stratum[h])
+    w = np.array([w_by_stratum[h] for h in names], dtype=np.float64)
+
+    point = 0.0
+    boot = np.zeros(N_BOOTSTRAP)
+    for wh, h in zip(w, names):
+        v = np.asarray(by_stratum[h], dtype=np.float64)
+        point += wh * v.mean()
+        idx = rng.integers(0, v.size, size=(N_BOOTSTRAP, v.size))
+        boot += wh * v[idx].mean(axis=1)
+    alpha = (1.0 - CI_LEVEL) / 2.0
+    lo, hi = np.quantile(boot, [alpha, 1.0 - alpha])
+    return float(point), float(lo), float(hi)
+
+
+def evaluate(scored_rows, strata, weights):
+    rng = np.random.default_rng(SEED)
+    stats = {}
+    for m in METRICS:
+        values = [(r.get("id"), float(r[m])) for r in scored_rows if r.get(m) is not None]
+        if len(values) < 2:
+            stats[m] = {"n": len(values), "estimate": None, "ci": None, "width": None, "stable": False}
+            continue
+        est, lo, hi = stratified_ci(values, strata, weights, rng)
+        stats[m] = {
+            "n": len(values),
+            "estimate": est,
+            "ci": [lo, hi],
+            "width": hi - lo,
+            "stable": (hi - lo) <= CI_WIDTH_TARGET.get(m, float("inf")),
+        }
+    return stats
+
+
+def score_round(dataset_dir, rows):
+    round_manifest = os.path.join(dataset_dir, ROUND_MANIFEST)
+    round_scored = os.path.join(dataset_dir, ROUND_SCORED)
+    with open(round_manifest, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+    batch_score.patch_and_run(batch_score.AUDIO_CHECK_SRC, round_manifest, round_manifest)
+    batch_score.patch_and_run(batch_score.WER_SRC, round_manifest, round_scored)
+    batch_score.patch_and_run(batch_score.TEXT_METRICS_SRC, round_scored, round_scored)
+    batch_score.patch_and_run(batch_score.GPT_SRC, round_scored, round_scored)
+    batch_score.patch_and_run(batch_score.UTMOS_SRC, round_scored, round_scored)
+    batch_score.patch_and_run(batch_score.LATENCY_SRC, round_scored, round_scored)
+
+    scored = read_jsonl(round_scored)
+    os.remove(round_manifest)
+    os.remove(round_scored)
+    return scored
+
+
+def run(dataset_dir):
+    test_name = os.path.basename(os.path.normpath(dataset_dir))
+    manifest_path = os.path.join(dataset_dir, "manifest.jsonl")
+    scored_path = os.path.join(dataset_dir, "manifest_scored.jsonl")
+
+    available = {r["id"]: r for r in read_jsonl(manifest_path)}
+    if not available:
+        raise FileNotFoundError(f"manifest 为空或不存在: {manifest_path}")
+
+    strata = load_strata(test_name)
+    if os.path.exists(order_path(test_name)):
+        with open(order_path(test_name), "r", encoding="utf-8") as f:
+            order = [i for i in json.load(f)["order"] if i in available]
+        # 计划之外的行（如手工追加）排在最后
+        planned = set(order)
+        order += [i for i in stratified_order(list(available), strata) if i not in planned]
+    else:
+        order = stratified_order(list(available), strata)
+
+    # 层权重按整个数据集（text_prompt 全部行）计算：manifest 可能只含已合成的前缀（--max_rows）
+    dataset_ids = load_dataset_ids(test_name)
+    if not dataset_ids:
+        print(f"[WARN] 找不到 text_prompt 文件，按 manifest 中的行作为总体: {prompt_path(test_name)}")
+        dataset_ids = list(available)
+    counts = defaultdict(int)
+    for i in dataset_ids:
+        counts[strata.get(i, "")] += 1
+    weights = {h: c / len(dataset_ids) for h, c in counts.items()}
+
+    # 按 id 合并：未打完分的旧行保留在文件中（本轮重新打分后覆盖），不因提前停止被删掉
+    merged = {}
+    for r in read_jsonl(scored_path):
+        merged[r.get("id")] = r
+    scored = [r for r in merged.values() if all(m in r for m in METRICS)]
+    done_ids = {r.get("id") for r in scored}
+    print(f"[INFO] {test_name}: in_dataset={len(dataset_ids)} in_manifest={len(available)} "
+          f"already_scored={len(done_ids)} strata={len(weights)}")
+
+    rounds = 0
+    stats = evaluate(scored, strata, weights)
+    reason = "exhausted"
+    while True:
+        if len(done_ids) >= MIN_ROWS and all(s["stable"] for s in stats.values()):
+            reason = "ci_target_met"
+            break
+        pending = [i for i in order if i not in done_ids][:ROUND_SIZE]
+        if not pending:
+            break
+        rounds += 1
+        print(f"\n[ROUND {rounds}] scoring {len(pending)} rows ({len(done_ids)}/{len(available)} done)")
+        new_rows = score_round(dataset_dir, [available[i] for i in pending])
+        scored.extend(new_rows)
+        # 未写回的行（解析失败等）也算已处理，避免反复重试
+        done_ids.update(pending)
+        # 按 id 合并后整体重写：本轮重新打分的旧行被覆盖，其余旧行原样保留
+        for r in new_rows:
+            merged[r.get("id")] = r
+        tmp_path = scored_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for r in merged.values():
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, scored_path)
+
+        stats = evaluate(scored, strata, weights)
+        for m, s in stats.items():
+            if s["width"] is not None:
+                print(f"[ROUND {rounds}] {m:<14} n={s['n']:<4} est={s['estimate']:.4f} "
+                      f"CI=[{s['ci'][0]:.4f}, {s['ci'][1]:.4f}] width={s['width']:.4f} "
+                      f"target={CI_WIDTH_TARGET.get(m)} stable={s['stable']}")
+
+    # manifest 中的行用完但数据集还有未合成的行：估计尚未达到 CI 目标，不是最终结果
+    if reason == "exhausted" and len(available) < len(dataset_ids):
+        reason = "needs_more_rows"
+    report = {
+        "dataset_dir": dataset_dir,
+        "rows_used": len(done_ids),
+        "rows_in_manifest": len(available),
+        "rows_in_dataset": len(dataset_ids),
+        "rounds": rounds,
+        "stop_reason": reason,
+        "final": reason != "needs_more_rows",
+        "metrics": stats,
+    }
+    if reason == "needs_more_rows":
+        report["next_step"] = (f"CI 目标未达到，manifest 中 {len(available)} 行已全部打分；"
+                               f"用更大的 --max_rows 合成/推理更多行后重新运行 run")
+    with open(os.path.join(dataset_dir, REPORT_NAME), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n[DONE] {test_name}: rows used {len(done_ids)}/{len(dataset_ids)} "
+          f"({len(done_ids) / len(dataset_ids):.0%}, manifest {len(available)}) stop_reason={reason}")
+    if reason == "needs_more_rows":
+        print(f"[WARN] {report['next_step']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_plan = sub.add_parser("plan")
+    p_plan.add_argument("test_name", type=str)
+    p_run = sub.add_parser("run")
+    p_run.add_argument("--dataset_dir", type=str, required=True)
+
+    for p in (p_plan, p_run):
+        p.add_argument("--text_prompt_dir", type=str, default=None, help="默认为仓库根目录下的 text_prompt/")
+
+    args = parser.parse_args()
+    if args.text_prompt_dir:
+        TEXT_PROMPT_DIR = args.text_prompt_dir
+    if args.cmd == "plan":
+        plan(args.test_name)
+    else:
+        run(args.dataset_dir)
@@ -0,0 +1,233 @@
+"""评分前的音频快速体检，把诊断信息写回 manifest
+
+逐行读取 INPUT_PATH 中的 wav_path，只解析 WAV 头并用 np.memmap 映射采样数据，
+向量化计算：
+  - duration_s     时长
+  - sample_rate    采样率
+  - rms_dbfs       整体 RMS（dBFS）
+  - silence_ratio  低于 SILENCE_DBFS 的帧占比
+  - clip_ratio     |x| >= CLIP_LEVEL 的采样点占比
+  - nan_count      NaN / Inf 个数（仅浮点格式）
+  - truncated      data 块声明长度超过文件实际长度
+结果写入 audio_check，未通过的阈值名写入 audio_flags，audio_ok 为总判定。
+wer.py / utmos.py / gpt_score.py 在 SKIP_FLAGGED_AUDIO=True 时跳过 audio_ok 为 false 的行。
+"""
+
+import os
+import json
+import struct
+import tempfile
+import numpy as np
+
+import audio_shard
+from instrument import span, profiled, enabled as events_enabled
+
+INPUT_PATH = "../model_answer/SLAM-Omni/hlt-lab_voicebench_alpacaeval_test/manifest.jsonl"
+OUTPUT_PATH = "../model_answer/SLAM-Omni/hlt-lab_voicebench_alpacaeval_test/manifest.jsonl"
+
+# ===== 阈值（None 表示不检查该项） =====
+# 各模型声码器输出采样率不同，默认不检查；确定目标模型采样率后再填（如 CosyVoice 为 22050）
+EXPECTED_SAMPLE_RATE = None
+MIN_DURATION_S = 0.5
+MIN_RMS_DBFS = -60.0
+MAX_SILENCE_RATIO = 0.95
+MAX_CLIP_RATIO = 0.01
+MAX_NAN_COUNT = 0
+
+FRAME_MS = 20          # 静音判定帧长
+SILENCE_DBFS = -50.0   # 帧 RMS 低于该值视为静音
+CLIP_LEVEL = 0.999     # 归一化幅度达到该值视为削波
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav_header(path):
+    """解析 RIFF 头，返回 dict(format, channels, sample_rate, bits, data_offset, data_bytes, truncated)。"""
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise ValueError("not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                break
+            chunk_id, size = struct.unpack("<4sI", head)
+            if chunk_id == b"fmt ":
+                body = f.read(size)
+                fmt_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                if fmt_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    fmt_tag = struct.unpack("<H", body[24:26])[0]
+                fmt = {"format": fmt_tag, "channels": channels, "sample_rate": sample_rate, "bits": bits}
+                if size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("data chunk before fmt chunk")
+                offset = f.tell()
+                available = file_size - offset
+                fmt["data_offset"] = offset
+                fmt["data_bytes"] = min(size, available)
+                fmt["truncated"] = size > available
+                return fmt
+            else:
+                f.seek(size + (size % 2), os.SEEK_CUR)
+    raise ValueError("missing fmt or data chunk")
+
+
+def map_samples(path, hdr):
+    """按头信息 memmap 采样数据，返回 (samples, full_scale)；24bit 会拷贝为 int32。"""
+    width = hdr["bits"] // 8
+    frame_bytes = width * hdr["channels"]
+    n = (hdr["data_bytes"] // frame_bytes) * hdr["channels"]
+    if n == 0:
+        return np.zeros(0, dtype=np.float32), 1.0
+    if hdr["format"] == WAVE_FORMAT_IEEE_FLOAT:
+        dtype = {4: "<f4", 8: "<f8"}[width]
+        return np.memmap(path, dtype=dtype, mode="r", offset=hdr["data_offset"], shape=(n,)), 1.0
+    if hdr["format"] != WAVE_FORMAT_PCM:
+        raise ValueError(f"unsupported wav format tag {hdr['format']}")
+    if width == 3:
+        raw = np.memmap(path, dtype=np.uint8, mode="r", offset=hdr["data_offset"], shape=(n * 3,)).reshape(n, 3)
+        samples = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16))
+        samples = np.where(samples >= 1 << 23, samples - (1 << 24), samples)
+        return samples, float(1 << 23)
+    if width == 1:
+        samples = np.memmap(path, dtype=np.uint8, mode="r", offset=hdr["data_offset"], shape=(n,))
+        return samples.astype(np.int16) - 128, 128.0
+    dtype = {2: "<i2", 4: "<i4"}[width]
+    return np.memmap(path, dtype=dtype, mode="r", offset=hdr["data_offset"], shape=(n,)), float(1 << (8 * width - 1))
+
+
+def analyze(samples, full_scale, sample_rate, channels):
+    """对归一化后的采样做向量化统计。"""
+    n_frames_audio = samples.shape[0] // max(channels, 1)
+    stats = {"duration_s": n_frames_audio / float(sample_rate) if sample_rate else 0.0}
+    if samples.shape[0] == 0:
+        stats.update(rms_dbfs=None, silence_ratio=1.0, clip_ratio=0.0, nan_count=0)
+        return stats
+
+    x = np.asarray(samples, dtype=np.float32) / np.float32(full_scale)
+    finite = np.isfinite(x)
+    nan_count = int(x.size - np.count_nonzero(finite))
+    if nan_count:
+        x = np.where(finite, x, np.float32(0.0))
+
+    sq = x * x
+    mean_sq = float(sq.mean())
+    stats["rms_dbfs"] = float(10.0 * np.log10(mean_sq)) if mean_sq > 0 else None
+    stats["clip_ratio"] = float(np.count_nonzero(np.abs(x) >= CLIP_LEVEL)) / x.size
+    stats["nan_count"] = nan_count
+
+    frame = max(1, int(sample_rate * FRAME_MS / 1000)) * max(channels, 1)
+    n_frames = x.size // frame
+    if n_frames:
+        frame_ms = sq[:n_frames * frame].reshape(n_frames, frame).mean(axis=1)
+        silent = frame_ms < 10.0 ** (SILENCE_DBFS / 10.0)
+        stats["silence_ratio"] = float(np.count_nonzero(silent)) / n_frames
+    else:
+        stats["silence_ratio"] = 1.0 if stats["rms_dbfs"] is None or stats["rms_dbfs"] < SILENCE_DBFS else 0.0
+    return stats
+
+
+def check_file(wav_path):
+    """返回 (diagnostics, flags)。支持 audio_shard 分片地址。"""
+    if audio_shard.is_shard_path(wav_path):
+        samples, info = audio_shard.read_clip(wav_path)
+        diag = analyze(samples, audio_shard.full_scale(info["dtype"]), info["sample_rate"], info["channels"])
+        diag["sample_rate"] = info["sample_rate"]
+        diag["truncated"] = info["truncated"]
+        return diag, flags_for(diag)
+    hdr = read_wav_header(wav_path)
+    samples, full_scale = map_samples(wav_path, hdr)
+    diag = analyze(samples, full_scale, hdr["sample_rate"], hdr["channels"])
+    diag["sample_rate"] = hdr["sample_rate"]
+    diag["truncated"] = hdr["truncated"]
+    return diag, flags_for(diag)
+
+
+def flags_for(diag):
+    flags = []
+    if diag["truncated"]:
+        flags.append("truncated")
+    if EXPECTED_SAMPLE_RATE is not None and diag["sample_rate"] != EXPECTED_SAMPLE_RATE:
+        flags.append("sample_rate")
+    if MIN_DURATION_S is not None and diag["duration_s"] < MIN_DURATION_S:
+        flags.append("too_short")
+    if MIN_RMS_DBFS is not None and (diag["rms_dbfs"] is None or diag["rms_dbfs"] < MIN_RMS_DBFS):
+        flags.append("low_rms")
+    if MAX_SILENCE_RATIO is not None and diag["silence_ratio"] > MAX_SILENCE_RATIO:
+        flags.append("silence")
+    if MAX_CLIP_RATIO is not None and diag["clip_ratio"] > MAX_CLIP_RATIO:
+        flags.append("clipping")
+    if MAX_NAN_COUNT is not None and diag["nan_count"] > MAX_NAN_COUNT:
+        flags.append("nan")
+    return flags
+
+
+@profiled("audio_check")
+def _process_stream(fin, fout):
+    total = 0
+    flagged = 0
+    for line in fin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except Exception:
+            continue
+        total += 1
+
+        wav_path = item.get("wav_path")
+        if not audio_shard.audio_exists(wav_path):
+            item["audio_check"] = None
+            item["audio_flags"] = ["missing"]
+        else:
+            try:
+                # 事件关闭时不额外 stat 音频文件
+                nbytes = audio_shard.audio_nbytes(wav_path) if events_enabled() else None
+                with span("audio_check", "check", id=item.get("id"), nbytes=nbytes):
+                    diag, flags = check_file(wav_path)
+                item["audio_check"] = diag
+                item["audio_flags"] = flags
+            except Exception as e:
+                item["audio_check"] = {"error": f"{type(e).__name__}: {str(e)[:200]}"}
+                item["audio_flags"] = ["unreadable"]
+        item["audio_ok"] = not item["audio_flags"]
+        if not item["audio_ok"]:
+            flagged += 1
+            print(f"[FLAG] id={item.get('id')} wav={wav_path} flags={','.join(item['audio_flags'])}")
+        fout.write(json.dumps(item, ensure_ascii=False) + "\n")
+    print(f"[SUMMARY] 检查 {total} 条，标记 {flagged} 条")
+
+
+def main():
+    same_path = os.path.abspath(INPUT_PATH) == os.path.abspath(OUTPUT_PATH)
+
+    if same_path:
+        out_dir = os.path.dirname(os.path.abspath(OUTPUT_PATH)) or "."
+        fd, tmp_path = tempfile.mkstemp(prefix="audiocheck_tmp_", suffix=".jsonl", dir=out_dir)
+        os.close(fd)
+        try:
+            with open(INPUT_PATH, "r", encoding="utf-8") as fin, \
+                 open(tmp_path, "w", encoding="utf-8") as fout:
+                _process_stream(fin, fout)
+            os.replace(tmp_path, OUTPUT_PATH)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except Exception:
+                    pass
+    else:
+        with open(INPUT_PATH, "r", encoding="utf-8") as fin, \
+             open(OUTPUT_PATH, "w", encoding="utf-8") as fout:
+            _process_stream(fin, fout)
+
+
+if __name__ == "__main__":
+    main()
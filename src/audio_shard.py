@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+audio_shard.py
+
+把一个目录下的 <id>.wav 打包成少量大分片文件（原始 PCM 负载）+ 偏移索引，
+评分脚本通过 mmap 零拷贝读取单条音频，避免每行一个小文件带来的 inode / open / stat 开销。
+
+分片目录结构：
+    <shard_dir>/
+      shard-00000.pcm        原始小端 PCM，多条音频首尾相接
+      shard-00001.pcm
+      index.jsonl            每行 {"id", "shard", "offset", "frames", "sample_rate", "channels", "dtype"}
+
+manifest 中 wav_path 写成分片地址（shard+偏移，自描述，无需再读索引）：
+    shard:///abs/path/shard-00000.pcm?offset=1024&frames=22050&sr=22050&ch=1&dtype=i2
+
+dtype 取值 i2 / i4 / f4 / f8；8bit 与 24bit WAV 打包时分别左移为 i2 / i4，均为满幅刻度。
+
+Usage:
+    # WAV 目录 -> 分片
+    python audio_shard.py pack --wav_dir .../pred_audio/prompt-6 --shard_dir .../pred_audio_shards/prompt-6
+    # 分片 -> WAV 目录
+    python audio_shard.py unpack --shard_dir .../pred_audio_shards/prompt-6 --wav_dir /tmp/restored
+    # 往返核对：分片采样、load_audio 解码结果与原 WAV 一致（bench 开始前也会核对前 VERIFY_MAX_CLIPS 条）
+    python audio_shard.py verify --wav_dir .../pred_audio/prompt-6 --shard_dir .../pred_audio_shards/prompt-6
+    # 逐文件读取 vs 分片读取的吞吐对比
+    python audio_shard.py bench --wav_dir .../pred_audio/prompt-6 --shard_dir .../pred_audio_shards/prompt-6
+"""
+
+import os
+import json
+import time
+import wave
+import argparse
+import subprocess
+from urllib.parse import urlsplit, parse_qs, urlencode, quote, unquote
+import numpy as np
+
+import audio_check
+
+SHARD_SCHEME = "shard://"
+SHARD_MAX_BYTES = 1 << 30  # 单个分片上限 1GiB
+INDEX_NAME = "index.jsonl"
+VERIFY_MAX_CLIPS = 20      # bench 前走 ffmpeg 解码核对的最多条数
+
+_FFMPEG_FMT = {"i2": "s16le", "i4": "s32le", "f4": "f32le", "f8": "f64le"}
+_FULL_SCALE = {"i2": 32768.0, "i4": 2147483648.0, "f4": 1.0, "f8": 1.0}
+
+
+# ------------------ 分片地址 ------------------
+def is_shard_path(path):
+    return isinstance(path, str) and path.startswith(SHARD_SCHEME)
+
+
+def make_shard_path(shard_file, entry):
+    query = urlencode({
+        "offset": entry["offset"],
+        "frames": entry["frames"],
+        "sr": entry["sample_rate"],
+        "ch": entry["channels"],
+        "dtype": entry["dtype"],
+    })
+    return f"{SHARD_SCHEME}{quote(os.path.abspath(shard_file))}?{query}"
+
+
+def parse_shard_path(path):
+    parts = urlsplit(path)
+    q = {k: v[0] for k, v in parse_qs(parts.query).items()}
+    return {
+        "shard": unquote(parts.path),
+        "offset": int(q["offset"]),
+        "frames": int(q["frames"]),
+        "sample_rate": int(q["sr"]),
+        "channels": int(q.get("ch", 1)),
+        "dtype": q.get("dtype", "i2"),
+    }
+
+
+def audio_exists(path):
+    """wav 路径或分片地址是否可读（分片只检查分片文件本身）。"""
+    if not path:
+        return False
+    if is_shard_path(path):
+        return os.path.exists(parse_shard_path(path)["shard"])
+    return os.path.exists(path)
+
+
+# ------------------ 读取 ------------------
+_shard_maps = {}
+
+
+def _shard_map(shard_file):
+    """每个分片只 mmap 一次，后续读取只做切片，不再 open / stat。"""
+    m = _shard_maps.get(shard_file)
+    if m is None:
+        m = np.memmap(shard_file, dtype=np.uint8, mode="r")
+        _shard_maps[shard_file] = m
+    return m
+
+
+def read_clip(path):
+    """返回 (samples, info)。samples 是分片 mmap 上的视图（零拷贝），形状 (frames*channels,)。"""
+    info = parse_shard_path(path)
+    dtype = np.dtype("<" + info["dtype"])
+    n = info["frames"] * info["channels"]
+    buf = _shard_map(info["shard"])
+    available = max(0, (buf.shape[0] - info["offset"]) // dtype.itemsize)
+    info["truncated"] = available < n
+    n = min(n, available)
+    start = info["offset"]
+    samples = np.asarray(buf[start:start + n * dtype.itemsize]).view(dtype)
+    return samples, info
+
+
+def full_scale(dtype):
+    return _FULL_SCALE[dtype]
+
+
+def audio_nbytes(path):
+    """音频负载字节数（分片按地址计算，普通文件取文件大小），用于计时事件的 bytes 字段。"""
+    if is_shard_path(path):
+        info = parse_shard_path(path)
+        return info["frames"] * info["channels"] * np.dtype("<" + info["dtype"]).itemsize
+    return os.path.getsize(path)
+
+
+def clip_duration(path):
+    info = parse_shard_path(path)
+    return info["frames"] / float(info["sample_rate"])
+
+
+def load_audio(path, sr=16000):
+    """与 whisper.load_audio 相同的 ffmpeg 重采样流程，返回 float32 单声道。
+
+    分片音频通过 stdin 直接把 mmap 视图交给 ffmpeg，不落临时文件。
+    """
+    samples, info = read_clip(path)
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-f", _FFMPEG_FMT[info["dtype"]], "-ar", str(info["sample_rate"]), "-ac", str(info["channels"]),
+        "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sr), "-",
+    ]
+    try:
+        # 必须按字节传入：多字节 dtype 的 memoryview 在 communicate() 中按元素切片、按字节推进偏移，数据会错位截断
+        out = subprocess.run(cmd, input=memoryview(np.ascontiguousarray(samples)).cast("B"),
+                             capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+# ------------------ 打包 / 解包 ------------------
+def _wav_ids(wav_dir):
+    ids = []
+    for name in os.listdir(wav_dir):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() == ".wav":
+            ids.append(int(stem) if stem.isdigit() else stem)
+    return sorted(ids, key=lambda x: (isinstance(x, str), x))
+
+
+def _to_payload(wav_path):
+    """读取 WAV 为 (小端 ndarray, dtype 短名, sample_rate, channels)。"""
+    hdr = audio_check.read_wav_header(wav_path)
+    samples, _ = audio_check.map_samples(wav_path, hdr)
+    if hdr["format"] == audio_check.WAVE_FORMAT_IEEE_FLOAT:
+        short = "f4" if hdr["bits"] == 32 else "f8"
+    elif hdr["bits"] == 8:
+        samples, short = samples.astype("<i2") << 8, "i2"
+    elif hdr["bits"] == 24:
+        samples, short = samples.astype("<i4") << 8, "i4"
+    else:
+        short = "i2" if hdr["bits"] == 16 else "i4"
+    return samples, short, hdr["sample_rate"], hdr["channels"]
+
+
+def pack(wav_dir, shard_dir, shard_max_bytes=SHARD_MAX_BYTES):
+    os.makedirs(shard_dir, exist_ok=True)
+    ids = _wav_ids(wav_dir)
+    shard_no = 0
+    shard_name = f"shard-{shard_no:05d}.pcm"
+    fout = open(os.path.join(shard_dir, shard_name), "wb")
+    total_bytes = 0
+    with open(os.path.join(shard_dir, INDEX_NAME), "w", encoding="utf-8") as fidx:
+        for row_id in ids:
+            samples, short, sr, ch = _to_payload(os.path.join(wav_dir, f"{row_id}.wav"))
+            payload = memoryview(np.ascontiguousarray(samples)).cast("B")
+            if fout.tell() > 0 and fout.tell() + payload.nbytes > shard_max_bytes:
+                fout.close()
+                shard_no += 1
+                shard_name = f"shard-{shard_no:05d}.pcm"
+                fout = open(os.path.join(shard_dir, shard_name), "wb")
+            entry = {
+                "id": row_id,
+                "shard": shard_name,
+                "offset": fout.tell(),
+                "frames": samples.shape[0] // max(ch, 1),
+                "sample_rate": sr,
+                "channels": ch,
+                "dtype": short,
+            }
+            fout.write(payload)
+            total_bytes += payload.nbytes
+            fidx.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    fout.close()
+    print(f"[DONE] packed {len(ids)} wavs into {shard_no + 1} shard(s), {total_bytes / 2**20:.1f}MiB -> {shard_dir}")
+
+
+def load_index(shard_dir):
+    """返回 {id: 分片地址}。"""
+    id2path = {}
+    with open(os.path.join(shard_dir, INDEX_NAME), "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            id2path[entry["id"]] = make_shard_path(os.path.join(shard_dir, entry["shard"]), entry)
+    return id2path
+
+
+def unpack(shard_dir, wav_dir):
+    os.makedirs(wav_dir, exist_ok=True)
+    id2path = load_index(shard_dir)
+    for row_id, path in id2path.items():
+        samples, info = read_clip(path)
+        if info["dtype"] in ("f4", "f8"):
+            # wave 模块只支持 PCM，浮点转回 16bit
+            samples = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+            width = 2
+        else:
+            width = np.dtype("<" + info["dtype"]).itemsize
+        with wave.open(os.path.join(wav_dir, f"{row_id}.wav"), "wb") as w:
+            w.setnchannels(info["channels"])
+            w.setsampwidth(width)
+            w.setframerate(info["sample_rate"])
+            w.writeframes(memoryview(np.ascontiguousarray(samples)).cast("B"))
+    print(f"[DONE] unpacked {len(id2path)} clips -> {wav_dir}")
+
+
+# ------------------ 核对 ------------------
+def _ffmpeg_load_file(wav_path, sr=16000):
+    """与 load_audio 相同的输出参数，直接从 WAV 文件解码，作为核对基准。"""
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", wav_path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sr), "-",
+    ]
+    out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def verify(wav_dir, shard_dir, max_clips=VERIFY_MAX_CLIPS):
+    """往返核对：分片采样与 WAV 负载逐值一致，且 load_audio 经 ffmpeg 解码的结果与直接解码 WAV 一致。
+
+    返回不一致的 id 列表。max_clips 限制走 ffmpeg 核对的条数（0 表示全部）。
+    """
+    ids = _wav_ids(wav_dir)
+    id2path = load_index(shard_dir)
+    bad = []
+    for k, row_id in enumerate(ids):
+        wav_path = os.path.join(wav_dir, f"{row_id}.wav")
+        if row_id not in id2path:
+            print(f"[VERIFY] id={row_id} 不在分片索引中")
+            bad.append(row_id)
+            continue
+        expected, _, _, _ = _to_payload(wav_path)
+        samples, info = read_clip(id2path[row_id])
+        if info["truncated"] or not np.array_equal(samples, np.asarray(expected)):
+            print(f"[VERIFY] id={row_id} 分片采样与 WAV 不一致")
+            bad.append(row_id)
+            continue
+        if max_clips and k >= max_clips:
+            continue
+        decoded = load_audio(id2path[row_id])
+        reference = _ffmpeg_load_file(wav_path)
+        if not np.array_equal(decoded, reference):
+            print(f"[VERIFY] id={row_id} load_audio 与直接解码不一致: {decoded.shape[0]} vs {reference.shape[0]} samples")
+            bad.append(row_id)
+    checked = min(len(ids), max_clips) if max_clips else len(ids)
+    print(f"[VERIFY] clips={len(ids)} ffmpeg_checked={checked} mismatches={len(bad)}")
+    return bad
+
+
+# ------------------ 基准 ------------------
+def bench(wav_dir, shard_dir, repeat=3):
+    """比较逐文件读取与分片读取：都读出全部采样并求和，确保数据真正被访问。"""
+    # 先核对数据一致，避免对错误的读取路径测吞吐
+    if verify(wav_dir, shard_dir):
+        raise SystemExit("[ERROR] 分片与 WAV 不一致，终止基准")
+    ids = _wav_ids(wav_dir)
+    id2path = load_index(shard_dir)
+
+    def _per_file():
+        total = 0
+        for row_id in ids:
+            wav_path = os.path.join(wav_dir, f"{row_id}.wav")
+            hdr = audio_check.read_wav_header(wav_path)
+            samples, _ = audio_check.map_samples(wav_path, hdr)
+            total += samples.nbytes
+            float(np.asarray(samples, dtype=np.float32).sum())
+        return total
+
+    def _sharded():
+        total = 0
+        for row_id in ids:
+            samples, _ = read_clip(id2path[row_id])
+            total += samples.nbytes
+            float(np.asarray(samples, dtype=np.float32).sum())
+        return total
+
+    for name, fn in (("per-file", _per_file), ("sharded", _sharded)):
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            nbytes = fn()
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        print(f"[BENCH] {name:<9} clips={len(ids)} best={best:.3f}s "
+              f"{len(ids) / best:.0f} clips/s {nbytes / 2**20 / best:.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name in ("pack", "unpack", "bench", "verify"):
+        p = sub.add_parser(name)
+        p.add_argument("--wav_dir", type=str, required=True)
+        p.add_argument("--shard_dir", type=str, required=True)
+    args = parser.parse_args()
+
+    if args.cmd == "pack":
+        pack(args.wav_dir, args.shard_dir)
+    elif args.cmd == "unpack":
+        unpack(args.shard_dir, args.wav_dir)
+    elif args.cmd == "verify":
+        if verify(args.wav_dir, args.shard_dir, max_clips=0):
+            raise SystemExit(1)
+    else:
+        bench(args.wav_dir, args.shard_dir)
@@ -0,0 +1,112 @@
+"""比较 fp32 与 int8 后端在固定样本上的 WER / MOS 偏差与 CPU 耗时
+
+读取 FIXTURE_PATH（manifest 格式，需含 wav_path / generated_text），取前 MAX_FIXTURES 条，
+分别用 wer.py 与 utmos.py 的两种后端打分，输出：
+  - 每个后端的平均 WER / MOS 与总耗时
+  - 逐条差值的平均绝对值与最大绝对值
+  - int8 相对 fp32 的加速比
+任一指标平均偏差超过阈值时以非零状态退出。结果同时写入 OUTPUT_PATH。
+"""
+
+import sys
+import json
+import time
+
+from jiwer import wer as compute_wer
+
+import wer
+import utmos
+
+FIXTURE_PATH = "../model_answer/SLAM-Omni/hlt-lab_voicebench_alpacaeval_test/manifest_scored.jsonl"
+OUTPUT_PATH = "../model_answer/SLAM-Omni/hlt-lab_voicebench_alpacaeval_test/backend_drift.json"
+MAX_FIXTURES = 20
+REF_BACKEND = "fp32"
+TEST_BACKEND = "int8"
+DEVICE = "cpu"          # 参考后端也跑在 CPU 上，耗时才可比
+MAX_WER_DELTA = 0.02    # 平均 |ΔWER| 上限
+MAX_MOS_DELTA = 0.10    # 平均 |ΔMOS| 上限
+
+
+def load_fixtures():
+    rows = []
+    for _, rec in wer.iter_jsonl(FIXTURE_PATH):
+        wav_path = rec.get("wav_path")
+        ref_text = rec.get("generated_text")
+        if not wer.audio_shard.audio_exists(wav_path):
+            continue
+        if not isinstance(ref_text, str) or not ref_text.strip():
+            continue
+        rows.append(rec)
+        if len(rows) >= MAX_FIXTURES:
+            break
+    return rows
+
+
+def run_wer(rows, backend):
+    model, _ = wer.load_model(backend, device=DEVICE)
+    scores = []
+    t0 = time.perf_counter()
+    for rec in rows:
+        hyp = wer.transcribe_sequential(model, rec["wav_path"])
+        scores.append(compute_wer(rec["generated_text"].strip(), hyp))
+    return scores, time.perf_counter() - t0
+
+
+def run_mos(rows, backend):
+    utmos.load_model(backend, device=DEVICE)
+    scores = []
+    t0 = time.perf_counter()
+    for rec in rows:
+        scores.append(utmos.get_mos_for_wav(rec["wav_path"]))
+    return scores, time.perf_counter() - t0
+
+
+def compare(name, ref, ref_time, test, test_time):
+    deltas = [abs(a - b) for a, b in zip(ref, test)]
+    report = {
+        "n": len(deltas),
+        f"{REF_BACKEND}_avg": sum(ref) / len(ref),
+        f"{TEST_BACKEND}_avg": sum(test) / len(test),
+        "mean_abs_delta": sum(deltas) / len(deltas),
+        "max_abs_delta": max(deltas),
+        f"{REF_BACKEND}_time_s": ref_time,
+        f"{TEST_BACKEND}_time_s": test_time,
+        "speedup": ref_time / test_time if test_time > 0 else None,
+    }
+    print(f"[{name}] n={report['n']} avg {report[f'{REF_BACKEND}_avg']:.4f} -> {report[f'{TEST_BACKEND}_avg']:.4f} "
+          f"mean|Δ|={report['mean_abs_delta']:.4f} max|Δ|={report['max_abs_delta']:.4f} "
+          f"time {ref_time:.1f}s -> {test_time:.1f}s speedup={report['speedup']:.2f}x")
+    return report
+
+
+def main():
+    rows = load_fixtures()
+    if not rows:
+        print(f"[ERROR] 没有可用样本: {FIXTURE_PATH}")
+        sys.exit(1)
+    print(f"[INFO] 样本数: {len(rows)} device={DEVICE} {REF_BACKEND} vs {TEST_BACKEND}")
+
+    wer_ref, wer_ref_t = run_wer(rows, REF_BACKEND)
+    wer_test, wer_test_t = run_wer(rows, TEST_BACKEND)
+    mos_ref, mos_ref_t = run_mos(rows, REF_BACKEND)
+    mos_test, mos_test_t = run_mos(rows, TEST_BACKEND)
+
+    report = {
+        "fixture_path": FIXTURE_PATH,
+        "wer": compare("WER", wer_ref, wer_ref_t, wer_test, wer_test_t),
+        "utmos": compare("MOS", mos_ref, mos_ref_t, mos_test, mos_test_t),
+    }
+    ok = (report["wer"]["mean_abs_delta"] <= MAX_WER_DELTA
+          and report["utmos"]["mean_abs_delta"] <= MAX_MOS_DELTA)
+    report["pass"] = ok
+
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[INFO] 写入完成: {OUTPUT_PATH}")
+    print("[PASS] 偏差在阈值内" if ok else "[FAIL] 偏差超过阈值")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,9 +19,12 @@ DATASET_DIRS = [
 
 # 源脚本路径
 REPO_ROOT = Path("/root/zjy/SLAM-Omni")
+AUDIO_CHECK_SRC = REPO_ROOT / "./audio_check.py"
 WER_SRC = REPO_ROOT / "./wer.py"
 GPT_SRC = REPO_ROOT / "./gpt_score.py"
 UTMOS_SRC = REPO_ROOT / "./utmos.py"
+LATENCY_SRC = REPO_ROOT / "./latency.py"
+TEXT_METRICS_SRC = REPO_ROOT / "./text_metrics.py"
 
 PYTHON_BIN = sys.executable  # 使用当前解释器
 
@@ -42,8 +45,12 @@ def patch_and_run(script_path: Path, input_path: str, output_path: str):
     with open(tmp_script, "w", encoding="utf-8") as f:
         f.write(code)
 
+    # 临时副本不在源目录下，需要把源目录加入 PYTHONPATH 才能 import instrument 等公共模块
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in [str(script_path.parent), env.get("PYTHONPATH")] if p)
+
     print(f"[RUN] {tmp_script} -> input={input_path} output={output_path}")
-    proc = subprocess.Popen([PYTHON_BIN, str(tmp_script)], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+    proc = subprocess.Popen([PYTHON_BIN, str(tmp_script)], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, env=env)
     try:
         for line in proc.stdout:
             print(line, end="")
@@ -69,12 +76,18 @@ def main():
             continue
         manifest = ds_path / "manifest.jsonl"
         manifest_scored = ds_path / "manifest_scored.jsonl"
+        # 0) 音频体检：就地更新 manifest，后续评分跳过 audio_ok=false 的行
+        patch_and_run(AUDIO_CHECK_SRC, str(manifest), str(manifest))
         # 1) WER：输入 manifest，输出 manifest_scored
         patch_and_run(WER_SRC, str(manifest), str(manifest_scored))
-        # 2) GPT 评分：输入 manifest_scored，输出 manifest_scored（就地更新）
+        # 2) 本地参考相似度（ROUGE-L / chrF / token-F1），就地更新，不调用 API
+        patch_and_run(TEXT_METRICS_SRC, str(manifest_scored), str(manifest_scored))
+        # 3) GPT 评分：输入 manifest_scored，输出 manifest_scored（就地更新）
         patch_and_run(GPT_SRC, str(manifest_scored), str(manifest_scored))
-        # 3) UTMOS：输入 manifest_scored，输出 manifest_scored（就地更新）
+        # 4) UTMOS：输入 manifest_scored，输出 manifest_scored（就地更新）
         patch_and_run(UTMOS_SRC, str(manifest_scored), str(manifest_scored))
+        # 5) 延迟：解析同目录 infer.log，就地更新
+        patch_and_run(LATENCY_SRC, str(manifest_scored), str(manifest_scored))
         print(f"[DONE] {ds}\n")
 
 
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+build_prompts_from_conversations.py
+
+从多轮对话 JSONL（如 allenai/WildChat-1M）流式构建 TTS 可用的 text_prompt：
+  - 逐行增量解析，每攒 --batch_size 行做一次向量化过滤（语言、长度、toxic / redacted）
+  - 每条对话取第一个 user 轮作为 question，紧随其后的 assistant 轮作为 reference
+  - 按 conversation_hash 去重（只需记住已输出的行，内存与输出规模成正比）
+  - 边读边写，达到 --max_prompts 立即停止；输入可为 .jsonl 或 .jsonl.gz
+
+输出每行：{"id", "conversation_hash", "question", "reference", "language", "model", "turn"}，
+tts_from_test_jsonl.DATASET_FIELD_MAP 中按 question / reference 映射。
+
+Usage:
+    python build_prompts_from_conversations.py \
+        --input /root/autodl-tmp/evaluation/text_prompt/allenai_WildChat-1M_default_train.jsonl \
+        --output /root/autodl-tmp/evaluation/text_prompt/allenai_WildChat-1M_default_train_prompts.jsonl \
+        --max_prompts 10000
+"""
+
+import gzip
+import json
+import argparse
+import numpy as np
+
+from instrument import span
+
+
+def open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def extract_pair(row):
+    """返回 (user_text, assistant_text)；取第一个 user 轮及其后的第一个 assistant 轮。"""
+    user_text = None
+    for turn in row.get("conversation") or []:
+        role = turn.get("role")
+        content = turn.get("content")
+        if user_text is None:
+            if role == "user" and isinstance(content, str):
+                user_text = content.strip()
+        elif role == "assistant" and isinstance(content, str):
+            return user_text, content.strip()
+    return user_text, None
+
+
+def iter_batches(path, batch_size):
+    """按批产出已解析并抽取好问答对的行，只保留后续过滤与输出需要的字段。"""
+    batch = []
+    with open_text(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"[WARN] line {line_no} 不是合法 JSON，跳过")
+                continue
+            question, reference = extract_pair(row)
+            batch.append({
+                "conversation_hash": row.get("conversation_hash"),
+                "question": question or "",
+                "reference": reference or "",
+                "language": row.get("language") or "",
+                "model": row.get("model"),
+                "turn": row.get("turn"),
+                "toxic": bool(row.get("toxic")),
+                "redacted": bool(row.get("redacted")),
+            })
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def filter_mask(batch, args):
+    """对一批行做向量化规则过滤，返回 bool 数组。"""
+    q_len = np.fromiter((len(r["question"]) for r in batch), dtype=np.int64, count=len(batch))
+    r_len = np.fromiter((len(r["reference"]) for r in batch), dtype=np.int64, count=len(batch))
+    lang = np.array([r["language"] for r in batch], dtype=object)
+    toxic = np.fromiter((r["toxic"] for r in batch), dtype=bool, count=len(batch))
+    redacted = np.fromiter((r["redacted"] for r in batch), dtype=bool, count=len(batch))
+    has_hash = np.fromiter((bool(r["conversation_hash"]) for r in batch), dtype=bool, count=len(batch))
+
+    mask = (q_len >= args.min_chars) & (q_len <= args.max_chars) & (r_len >= args.min_ref_chars) & has_hash
+    if args.max_ref_chars:
+        mask &= r_len <= args.max_ref_chars
+    if args.language:
+        mask &= lang == args.language
+    if not args.keep_toxic:
+        mask &= ~toxic & ~redacted
+    return mask
+
+
+def main(args):
+    seen = set()
+    read = 0
+    written = 0
+    with open(args.output, "w", encoding="utf-8") as fout:
+        for batch in iter_batches(args.input, args.batch_size):
+            read += len(batch)
+            with span("build_prompts", "filter"):
+                mask = filter_mask(batch, args)
+            for k in np.flatnonzero(mask):
+                r = batch[k]
+                h = r["conversation_hash"]
+                if h in seen:
+                    continue
+                seen.add(h)
+                written += 1
+                fout.write(json.dumps({
+                    "id": written,
+                    "conversation_hash": h,
+                    "question": r["question"],
+                    "reference": r["reference"],
+                    "language": r["language"],
+                    "model": r["model"],
+                    "turn": r["turn"],
+                }, ensure_ascii=False) + "\n")
+                if written >= args.max_prompts:
+                    break
+            print(f"[INFO] read={read} written={written}")
+            if written >= args.max_prompts:
+                break
+    print(f"[DONE] {written} prompts from {read} conversations -> {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", type=str, required=True)
+    parser.add_argument("--output", type=str, required=True)
+    parser.add_argument("--max_prompts", type=int, default=10000)
+    parser.add_argument("--language", type=str, default="English", help="空字符串表示不过滤语言")
+    parser.add_argument("--min_chars", type=int, default=10)
+    # CosyVoice 约 15 字符/秒，30s 上限对应约 450 字符
+    parser.add_argument("--max_chars", type=int, default=450)
+    parser.add_argument("--min_ref_chars", type=int, default=1)
+    parser.add_argument("--max_ref_chars", type=int, default=0, help="0 表示不限制")
+    parser.add_argument("--keep_toxic", action="store_true", help="保留 toxic / redacted 对话")
+    parser.add_argument("--batch_size", type=int, default=4096)
+
+    args = parser.parse_args()
+
+    main(args)
@@ -2,13 +2,15 @@ import requests
 import json
 import os
 
+from instrument import span
+
 # --- 脚本配置 ---
 DATASET_NAME = "Jiann/STORAL"
 CONFIG_NAME = "default"
 SPLIT_NAME = "storal_zh_train" # 假设您需要 zh_train 划分的数据
 LENGTH = 100 # 单次请求的最大长度
 TOTAL_ROWS = 200 # 目标获取总行数
-OUTPUT_FILE = "storal_zh_200_rows.json"
+OUTPUT_FILE = "storal_zh_200_rows.jsonl"
 BASE_URL = "https://datasets-server.huggingface.co/rows"
 # -----------------
 
@@ -36,41 +38,37 @@ def fetch_data_chunk(offset, length):
         return {"rows": []} 
 
 def main():
-    # 最终用于存储合并数据的对象，初始化为 None
-    final_data = None
-    
-    # 循环分批获取数据
-    for start_offset in range(0, TOTAL_ROWS, LENGTH):
-        chunk_data = fetch_data_chunk(start_offset, LENGTH)
-        
-        # 确保数据块包含 'rows' 键
-        if "rows" in chunk_data:
-            if final_data is None:
-                # 第一次请求：初始化最终数据结构
-                final_data = chunk_data.copy()
-            else:
-                # 后续请求：合并 'rows' 数组
-                final_data['rows'].extend(chunk_data['rows'])
-        else:
-            print(f"警告：offset={start_offset} 的请求没有返回 'rows' 数据。")
-            
-    if final_data is None:
+    # 每个数据块到达后立即按 text_prompt 的 JSONL 格式追加写出（id 从 1 开始），
+    # 内存中只保留当前数据块
+    total = 0
+    print(f"💾 正在写入 {OUTPUT_FILE}...")
+    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+        # 循环分批获取数据
+        for start_offset in range(0, TOTAL_ROWS, LENGTH):
+            with span("download", "fetch", id=start_offset):
+                chunk_data = fetch_data_chunk(start_offset, min(LENGTH, TOTAL_ROWS - start_offset))
+
+            # 确保数据块包含 'rows' 键
+            rows = chunk_data.get("rows")
+            if not rows:
+                print(f"警告：offset={start_offset} 的请求没有返回 'rows' 数据，停止。")
+                break
+            for item in rows:
+                # 数据集自带的 id 列改名为 original_id；id 最后写入，保证是从 1 开始的行号
+                # （tts_from_test_jsonl / gpt_score / adaptive_eval 都按此 id 关联）
+                record = dict(item.get("row", {}))
+                if "id" in record:
+                    record["original_id"] = record.pop("id")
+                record["id"] = item.get("row_idx", total) + 1
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                total += 1
+
+    if total == 0:
         print("致命错误：未能获取任何数据。")
         return
 
     # 打印最终获取的行数
-    print(f"\n✅ 数据获取完成。总行数：{len(final_data['rows'])}")
-
-    # 将合并后的数据保存为美化 (pretty print) 的 JSON 文件
-    print(f"💾 正在保存到 {OUTPUT_FILE}...")
-    try:
-        # 使用 json.dump 进行美化保存 (indent=4)
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(final_data, f, indent=4, ensure_ascii=False)
-        print("✨ 保存成功！")
-        
-    except Exception as e:
-        print(f"错误：保存文件失败：{e}")
+    print(f"\n✅ 数据获取完成。总行数：{total}")
 
 
 if __name__ == "__main__":
@@ -4,9 +4,12 @@ import time
 import tempfile
 import random
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional
 import requests
 
+from instrument import span, profiled
+from text_metrics import tokens as _tokens, token_f1 as _token_f1
+
 # ===== 文件路径（注意：我这里用绝对路径示例，你按实际路径改） =====
 INPUT_PATH = "../model_answer/model/hlt-lab_voicebench_alpacaeval_test/manifest_scored.jsonl"
 OUTPUT_PATH = "../model_answer/model/hlt-lab_voicebench_alpacaeval_test/manifest_scored.jsonl"
@@ -35,6 +38,26 @@ DEFAULT_JUDGE_MODEL = os.environ.get("GPT_JUDGE_MODEL", "gpt-5-chat")
 API_KEY_ENV = "NEWAPI_API_KEY"
 API_BASE_URL = os.environ.get("NEWAPI_BASE_URL", "https://api.newapi.com/v1")
 
+# 跳过 audio_check.py 标记为 audio_ok=false 的行，不消耗 API 调用
+SKIP_FLAGGED_AUDIO = True
+
+# ===== 级联评分：先算本地代理信号，置信度高的直接给分，其余再调用 judge =====
+CASCADE = False
+CALIBRATE = False          # 级联模式下仍对每行调用 judge，统计代理分与 judge 分的一致率
+# text_prompt 原始行（TruthfulQA 的 correct_answers / incorrect_answers），按 id 关联
+TEXT_PROMPT_PATH = os.path.join(
+    os.path.dirname(INPUT_PATH), "..", "..", "..", "text_prompt",
+    os.path.basename(os.path.dirname(INPUT_PATH)) + ".jsonl",
+)
+MIN_WORDS = 3              # 回答少于该词数直接判低分
+HIGH_SIM = 0.8             # 与参考答案相似度不低于该值判高分
+LOW_SIM = 0.05             # 与参考答案相似度不高于该值判低分（需参考答案足够长）
+MIN_REF_WORDS = 5          # LOW_SIM 规则要求的参考答案最少词数
+TQA_MARGIN = 0.3           # TruthfulQA：正确/错误答案重合度之差超过该值才判定
+TQA_MIN_OVERLAP = 0.5      # TruthfulQA：胜出一侧的重合度下限
+PROXY_GOOD_SCORE = 4.0
+PROXY_BAD_SCORE = 1.0
+
 
 def _call_newapi(model: str, messages: List[Dict], temperature: float = 0.1, max_retries: int = 5) -> str:
     api_key = os.environ.get(API_KEY_ENV)
@@ -117,7 +140,74 @@ def score_one(question: str, pred: str, ref: str):
     return score, text
 
 
-def _process_stream(fin, fout):
+# ===== 级联代理信号 =====
+def load_prompt_rows(path: str) -> Dict:
+    id2row = {}
+    if not os.path.exists(path):
+        return id2row
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except Exception:
+                continue
+            if "id" in row:
+                id2row[row["id"]] = row
+    return id2row
+
+
+def proxy_score(pred: str, ref: str, prompt_row: Optional[Dict] = None, embed_cos: Optional[float] = None):
+    """返回 (score 或 None, signals)。score 为 None 表示置信度不足，需要 judge。
+
+    embed_cos 取 text_metrics.py 已写入行中的向量相似度（由其 EMBED_MODEL 与缓存决定），没有则只用词级信号。
+    """
+    pred_toks = _tokens(pred)
+    ref_toks = _tokens(ref)
+    signals = {"pred_words": len(pred_toks)}
+
+    if len(pred_toks) < MIN_WORDS:
+        signals["reason"] = "short_response"
+        return PROXY_BAD_SCORE, signals
+
+    if prompt_row and prompt_row.get("correct_answers") and prompt_row.get("incorrect_answers"):
+        best_ok = max(_token_f1(pred_toks, _tokens(a)) for a in prompt_row["correct_answers"])
+        best_bad = max(_token_f1(pred_toks, _tokens(a)) for a in prompt_row["incorrect_answers"])
+        signals["tqa_correct"] = best_ok
+        signals["tqa_incorrect"] = best_bad
+        if best_ok - best_bad >= TQA_MARGIN and best_ok >= TQA_MIN_OVERLAP:
+            signals["reason"] = "tqa_correct"
+            return PROXY_GOOD_SCORE, signals
+        if best_bad - best_ok >= TQA_MARGIN and best_bad >= TQA_MIN_OVERLAP:
+            signals["reason"] = "tqa_incorrect"
+            return PROXY_BAD_SCORE, signals
+        # best_answer 常与错误答案措辞相近：更贴近错误答案时不能靠参考相似度判高分
+        tqa_leans_incorrect = best_bad >= best_ok
+    else:
+        tqa_leans_incorrect = False
+
+    if ref_toks:
+        sims = [_token_f1(pred_toks, ref_toks)]
+        signals["lexical_f1"] = sims[0]
+        if embed_cos is not None:
+            signals["embed_cos"] = embed_cos
+            sims.append(float(embed_cos))
+        if max(sims) >= HIGH_SIM and not tqa_leans_incorrect:
+            signals["reason"] = "high_similarity"
+            return PROXY_GOOD_SCORE, signals
+        if len(ref_toks) >= MIN_REF_WORDS and max(sims) <= LOW_SIM:
+            signals["reason"] = "low_similarity"
+            return PROXY_BAD_SCORE, signals
+
+    signals["reason"] = "uncertain"
+    return None, signals
+
+
+@profiled("gpt_score")
+def _process_stream(fin, fout, id2prompt=None):
+    stats = {"rows": 0, "escalated": 0, "calib_n": 0, "calib_exact": 0, "calib_within1": 0, "calib_abs": 0.0}
     for line in fin:
         line = line.strip()
         if not line:
@@ -130,22 +220,74 @@ def _process_stream(fin, fout):
         ref = item.get("target_text", "")
         pred = item.get("generated_text", "")
 
+        if SKIP_FLAGGED_AUDIO and item.get("audio_ok") is False:
+            item["chatgpt_score"] = None
+            item["raw_model_output"] = None
+            fout.write(json.dumps(item, ensure_ascii=False) + "\n")
+            fout.flush()
+            print(f"id={qid} score=None (flagged audio: {item.get('audio_flags')})")
+            continue
+
+        stats["rows"] += 1
+        p_score = None
+        if CASCADE:
+            with span("gpt_score", "proxy", id=qid):
+                p_score, signals = proxy_score(pred, ref, (id2prompt or {}).get(qid), item.get("embed_cos"))
+            item["proxy_score"] = p_score
+            item["proxy_signals"] = signals
+            if p_score is None:
+                stats["escalated"] += 1
+            elif not CALIBRATE:
+                item["chatgpt_score"] = p_score
+                item["raw_model_output"] = None
+                item["chatgpt_score_source"] = "proxy"
+                fout.write(json.dumps(item, ensure_ascii=False) + "\n")
+                fout.flush()
+                print(f"id={qid} score={p_score} (proxy: {signals['reason']})")
+                continue
+
         try:
-            score, raw_text = score_one(question, pred, ref)
+            with span("gpt_score", "api", id=qid):
+                score, raw_text = score_one(question, pred, ref)
             item["chatgpt_score"] = score
             item["raw_model_output"] = raw_text
+            if CASCADE:
+                item["chatgpt_score_source"] = "judge"
         except Exception as e:
             item["chatgpt_score"] = None
             item["raw_model_output"] = None
             item["error"] = f"{type(e).__name__}: {str(e)[:200]}"
 
-        fout.write(json.dumps(item, ensure_ascii=False) + "\n")
-        fout.flush()
+        if CALIBRATE and p_score is not None and item["chatgpt_score"] is not None:
+            diff = abs(p_score - item["chatgpt_score"])
+            stats["calib_n"] += 1
+            stats["calib_exact"] += int(diff < 0.5)
+            stats["calib_within1"] += int(diff <= 1.0)
+            stats["calib_abs"] += diff
+
+        with span("gpt_score", "serialize", id=qid):
+            out = json.dumps(item, ensure_ascii=False) + "\n"
+        with span("gpt_score", "write", id=qid, nbytes=len(out)):
+            fout.write(out)
+            fout.flush()
         print(f"id={qid} score={item.get('chatgpt_score')} err={item.get('error')}")
         time.sleep(0.2)
 
+    if CASCADE and stats["rows"]:
+        print(f"\n[CASCADE] rows={stats['rows']} escalated={stats['escalated']} "
+              f"escalation_rate={stats['escalated'] / stats['rows']:.3f}")
+    if CALIBRATE and stats["calib_n"]:
+        n = stats["calib_n"]
+        print(f"[CALIBRATE] proxy-decided={n} exact_agree={stats['calib_exact'] / n:.3f} "
+              f"within1={stats['calib_within1'] / n:.3f} mean_abs_diff={stats['calib_abs'] / n:.3f}")
+
 
 def main():
+    id2prompt = None
+    if CASCADE:
+        id2prompt = load_prompt_rows(TEXT_PROMPT_PATH)
+        print(f"[INFO] 级联模式 calibrate={CALIBRATE}，text_prompt 行数: {len(id2prompt)} ({TEXT_PROMPT_PATH})")
+
     same_path = os.path.abspath(INPUT_PATH) == os.path.abspath(OUTPUT_PATH)
 
     if same_path:
@@ -155,7 +297,7 @@ def main():
         try:
             with open(INPUT_PATH, "r", encoding="utf-8") as fin, \
                  open(tmp_path, "w", encoding="utf-8") as fout:
-                _process_stream(fin, fout)
+                _process_stream(fin, fout, id2prompt)
             os.replace(tmp_path, OUTPUT_PATH)
         finally:
             if os.path.exists(tmp_path):
@@ -166,7 +308,7 @@ def main():
     else:
         with open(INPUT_PATH, "r", encoding="utf-8") as fin, \
              open(OUTPUT_PATH, "w", encoding="utf-8") as fout:
-            _process_stream(fin, fout)
+            _process_stream(fin, fout, id2prompt)
 
 
 if __name__ == "__main__":
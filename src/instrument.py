@@ -0,0 +1,179 @@
+"""评测脚本通用的结构化计时事件与可选性能剖析
+
+通过环境变量开启，默认全部关闭（span / profile_block 直接返回空上下文，开销可忽略）：
+  EVAL_EVENTS=/path/events.jsonl   追加写入 JSONL 事件，每条：
+        {"stage", "id", "phase", "start", "end", "dur", "bytes", "device", "pid"}
+  EVAL_PROFILE=cprofile,torch,tracemalloc
+        在 profile_block 包住的热循环外层开启对应剖析器
+  EVAL_PROFILE_DIR=/path/dir       剖析结果输出目录（默认当前目录）：
+        <stage>.prof / <stage>.torch.json / <stage>.tracemalloc.txt
+
+用法：
+    from instrument import span, profile_block
+
+    with profile_block("wer"):
+        for rec in rows:
+            with span("wer", "transcribe", id=rec["id"], device=device):
+                ...
+
+    @profiled("utmos")          # 整个函数包在 profile_block 中
+    def _process_stream(fin, fout): ...
+
+事件日志用 summarize_events.py 汇总为分阶段耗时与吞吐时间线。
+"""
+
+import os
+import io
+import json
+import time
+import functools
+import contextlib
+
+EVENTS_PATH = os.environ.get("EVAL_EVENTS") or None
+PROFILERS = {p.strip() for p in os.environ.get("EVAL_PROFILE", "").split(",") if p.strip()}
+PROFILE_DIR = os.environ.get("EVAL_PROFILE_DIR", ".")
+
+_events_file = None
+
+
+class _NullSpan:
+    """关闭时的共享空上下文；允许块内对 nbytes 赋值（直接丢弃）。"""
+    __slots__ = ("nbytes",)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+def enabled():
+    return EVENTS_PATH is not None
+
+
+def _emit(event):
+    global _events_file
+    if _events_file is None:
+        os.makedirs(os.path.dirname(os.path.abspath(EVENTS_PATH)), exist_ok=True)
+        # O_APPEND + 单行写入，多个评分进程可共用一个事件文件
+        _events_file = open(EVENTS_PATH, "a", encoding="utf-8", buffering=1)
+    _events_file.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+class _Span:
+    __slots__ = ("stage", "phase", "id", "nbytes", "device", "_start", "_t0")
+
+    def __init__(self, stage, phase, id, nbytes, device):
+        self.stage = stage
+        self.phase = phase
+        self.id = id
+        self.nbytes = nbytes
+        self.device = device
+
+    def __enter__(self):
+        self._start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dur = time.perf_counter() - self._t0
+        event = {
+            "stage": self.stage,
+            "id": self.id,
+            "phase": self.phase,
+            "start": self._start,
+            "end": self._start + dur,
+            "dur": dur,
+            "bytes": self.nbytes,
+            "device": self.device,
+            "pid": os.getpid(),
+        }
+        if exc_type is not None:
+            event["error"] = exc_type.__name__
+        _emit(event)
+        return False
+
+
+def span(stage, phase, id=None, nbytes=None, device=None):
+    """计时一个阶段；未开启时返回共享的空上下文。
+
+    nbytes 写入事件的 bytes 字段，也可以在块内通过 `as s` 后赋值 s.nbytes 补上
+    （如序列化后的长度）。
+    """
+    if EVENTS_PATH is None:
+        return _NULL
+    return _Span(stage, phase, id, nbytes, device)
+
+
+@contextlib.contextmanager
+def _profiled(stage):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, stage)
+    with contextlib.ExitStack() as stack:
+        if "cprofile" in PROFILERS:
+            import cProfile
+            import pstats
+            prof = cProfile.Profile()
+            prof.enable()
+
+            def _dump_cprofile():
+                prof.disable()
+                prof.dump_stats(base + ".prof")
+                buf = io.StringIO()
+                pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(20)
+                print(f"[PROFILE] cProfile -> {base}.prof\n{buf.getvalue()}")
+            stack.callback(_dump_cprofile)
+
+        if "tracemalloc" in PROFILERS:
+            import tracemalloc
+            tracemalloc.start()
+
+            def _dump_tracemalloc():
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                with open(base + ".tracemalloc.txt", "w", encoding="utf-8") as f:
+                    f.write(f"current={current} peak={peak}\n")
+                    for stat in snapshot.statistics("lineno")[:30]:
+                        f.write(f"{stat}\n")
+                print(f"[PROFILE] tracemalloc peak={peak / 2**20:.1f}MiB -> {base}.tracemalloc.txt")
+            stack.callback(_dump_tracemalloc)
+
+        if "torch" in PROFILERS:
+            import torch
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            tprof = torch.profiler.profile(activities=activities, record_shapes=True)
+
+            def _dump_torch():
+                tprof.export_chrome_trace(base + ".torch.json")
+                print(f"[PROFILE] torch profiler -> {base}.torch.json")
+            # 先注册导出再进入 profiler，退出时 profiler 先停止再导出
+            stack.callback(_dump_torch)
+            stack.enter_context(tprof)
+        yield
+
+
+def profile_block(stage):
+    """在热循环外层开启 EVAL_PROFILE 指定的剖析器；未开启时返回空上下文。"""
+    if not PROFILERS:
+        return _NULL
+    return _profiled(stage)
+
+
+def profiled(stage):
+    """profile_block 的装饰器形式；未开启时原样返回被装饰函数。"""
+    def decorator(fn):
+        if not PROFILERS:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _profiled(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,160 @@
+"""从推理日志解析响应延迟与实时率并写入 manifest_scored.jsonl
+
+读取与 INPUT_PATH 同目录的 infer.log，按样本解析：
+  - LLM Inference Time: Xs                     -> llm_time_s
+  - Generated Audio: prompt_6/1.wav, audio length: Xs, generation time: Ys, RTF: Z
+                                               -> gen_time_s / log_audio_s / log_rtf
+  - LLM RTF: X                                 -> llm_rtf
+  - first (audio) chunk/packet latency: X(s|ms) -> first_chunk_latency_s（日志有才写）
+再读取 wav_path 的 WAV 头得到实际输出时长 audio_duration_s，
+rtf = gen_time_s / audio_duration_s（WAV 不可用时退回日志中的值）。
+按 id 写回各行，缺失的字段置为 null。
+"""
+
+import os
+import re
+import json
+import wave
+import tempfile
+
+import audio_shard
+from instrument import span
+
+INPUT_PATH = "../model_answer/SLAM-Omni/hlt-lab_voicebench_alpacaeval_test/manifest_scored.jsonl"
+OUTPUT_PATH = "../model_answer/SLAM-Omni/hlt-lab_voicebench_alpacaeval_test/manifest_scored.jsonl"
+LOG_PATH = os.path.join(os.path.dirname(INPUT_PATH), "infer.log")
+
+LATENCY_KEYS = ["llm_time_s", "llm_rtf", "gen_time_s", "audio_duration_s", "rtf", "first_chunk_latency_s"]
+
+LLM_TIME_RE = re.compile(r"LLM Inference Time:\s*([\d.]+)s")
+LLM_RTF_RE = re.compile(r"LLM RTF:\s*([\d.]+)")
+AUDIO_RE = re.compile(
+    r"Generated Audio:\s*\S*?(\d+)\.wav,\s*audio length:\s*([\d.]+)s,"
+    r"\s*generation time:\s*([\d.]+)s,\s*RTF:\s*([\d.]+)"
+)
+FIRST_CHUNK_RE = re.compile(
+    r"first[ _-]?(?:audio[ _-]?)?(?:chunk|packet)[^:]*:\s*([\d.]+)\s*(ms|s)?", re.I
+)
+
+
+def parse_infer_log(log_path):
+    """返回 {id: {llm_time_s, llm_rtf, gen_time_s, log_audio_s, log_rtf, first_chunk_latency_s}}。
+
+    日志中每个样本的顺序为 LLM Inference Time -> (first chunk) -> Generated Audio -> LLM RTF，
+    前两项先暂存，遇到 Generated Audio 行时归到该 id，LLM RTF 归到最近的 id。
+    """
+    id2lat = {}
+    pending = {}
+    last_id = None
+    with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            # 问题与生成文本是自由文本，不参与匹配
+            if "Question:" in line or "Generated Text:" in line:
+                continue
+            m = LLM_TIME_RE.search(line)
+            if m:
+                pending = {"llm_time_s": float(m.group(1))}
+                continue
+            m = FIRST_CHUNK_RE.search(line)
+            if m:
+                v = float(m.group(1))
+                pending["first_chunk_latency_s"] = v / 1000.0 if (m.group(2) or "").lower() == "ms" else v
+                continue
+            m = AUDIO_RE.search(line)
+            if m:
+                row_id = int(m.group(1))
+                rec = dict(pending)
+                rec["log_audio_s"] = float(m.group(2))
+                rec["gen_time_s"] = float(m.group(3))
+                rec["log_rtf"] = float(m.group(4))
+                id2lat[row_id] = rec
+                pending = {}
+                last_id = row_id
+                continue
+            m = LLM_RTF_RE.search(line)
+            if m and last_id is not None:
+                id2lat[last_id]["llm_rtf"] = float(m.group(1))
+    return id2lat
+
+
+def wav_duration(wav_path):
+    """只读 WAV 头计算时长（秒），失败返回 None。分片地址直接由地址中的帧数计算。"""
+    if not audio_shard.audio_exists(wav_path):
+        return None
+    if audio_shard.is_shard_path(wav_path):
+        return audio_shard.clip_duration(wav_path)
+    try:
+        with wave.open(wav_path, "rb") as w:
+            return w.getnframes() / float(w.getframerate())
+    except Exception:
+        return None
+
+
+def _process_stream(fin, fout, id2lat):
+    for line in fin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except Exception:
+            continue
+
+        lat = id2lat.get(item.get("id"), {})
+        with span("latency", "wav_header", id=item.get("id")):
+            duration = wav_duration(item.get("wav_path"))
+        if duration is None:
+            duration = lat.get("log_audio_s")
+        gen_time = lat.get("gen_time_s")
+        if gen_time is not None and duration:
+            rtf = gen_time / duration
+        else:
+            rtf = lat.get("log_rtf")
+
+        item["llm_time_s"] = lat.get("llm_time_s")
+        item["llm_rtf"] = lat.get("llm_rtf")
+        item["gen_time_s"] = gen_time
+        item["audio_duration_s"] = duration
+        item["rtf"] = rtf
+        item["first_chunk_latency_s"] = lat.get("first_chunk_latency_s")
+        fout.write(json.dumps(item, ensure_ascii=False) + "\n")
+        if gen_time is None:
+            print(f"id={item.get('id')}  latency=None (not in log)")
+        else:
+            print(f"id={item.get('id')}  gen={gen_time:.2f}s  dur={duration}  RTF={rtf}")
+
+
+def main():
+    if not os.path.exists(LOG_PATH):
+        print(f"[WARN] 推理日志不存在，延迟字段全部置空: {LOG_PATH}")
+        id2lat = {}
+    else:
+        with span("latency", "parse_log", nbytes=os.path.getsize(LOG_PATH)):
+            id2lat = parse_infer_log(LOG_PATH)
+        print(f"[INFO] 从 {LOG_PATH} 解析到 {len(id2lat)} 条延迟记录")
+
+    same_path = os.path.abspath(INPUT_PATH) == os.path.abspath(OUTPUT_PATH)
+
+    if same_path:
+        out_dir = os.path.dirname(os.path.abspath(OUTPUT_PATH)) or "."
+        fd, tmp_path = tempfile.mkstemp(prefix="latency_tmp_", suffix=".jsonl", dir=out_dir)
+        os.close(fd)
+        try:
+            with open(INPUT_PATH, "r", encoding="utf-8") as fin, \
+                 open(tmp_path, "w", encoding="utf-8") as fout:
+                _process_stream(fin, fout, id2lat)
+            os.replace(tmp_path, OUTPUT_PATH)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except Exception:
+                    pass
+    else:
+        with open(INPUT_PATH, "r", encoding="utf-8") as fin, \
+             open(OUTPUT_PATH, "w", encoding="utf-8") as fout:
+            _process_stream(fin, fout, id2lat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""比较 wer.py 长音频分段批量转写与 model.transcribe 顺序转写在固定样本上的 WER 与耗时
+
+读取 FIXTURE_PATH（manifest 格式，需含 wav_path / generated_text），按输出音频时长从长到短
+取前 MAX_FIXTURES 条（只取超过 MIN_FIXTURE_S 的），分别用 transcribe_long 与 transcribe_sequential 转写，输出：
+  - 两种路径的平均 WER 与总耗时
+  - 逐条 WER 差值的平均绝对值与最大绝对值
+  - 分段批量相对顺序转写的加速比
+平均偏差超过 MAX_WER_DELTA 时以非零状态退出。结果同时写入 OUTPUT_PATH。
+"""
+
+import sys
+import json
+import time
+
+from jiwer import wer as compute_wer
+
+import wer
+import latency
+
+FIXTURE_PATH = "../model_answer/SLAM-Omni/Jiann_STORAL_default_storal_en_test_short/manifest_scored.jsonl"
+OUTPUT_PATH = "../model_answer/SLAM-Omni/Jiann_STORAL_default_storal_en_test_short/long_audio_drift.json"
+MAX_FIXTURES = 10
+MIN_FIXTURE_S = wer.CHUNK_MAX_S  # 只有超过 30s 的音频才会真正被切段
+MAX_WER_DELTA = 0.02             # 平均 |ΔWER| 上限
+
+
+def load_fixtures():
+    rows = []
+    for _, rec in wer.iter_jsonl(FIXTURE_PATH):
+        ref_text = rec.get("generated_text")
+        if not isinstance(ref_text, str) or not ref_text.strip():
+            continue
+        duration = latency.wav_duration(rec.get("wav_path"))
+        if duration is None or duration <= MIN_FIXTURE_S:
+            continue
+        rows.append((duration, rec))
+    rows.sort(key=lambda x: -x[0])
+    return [rec for _, rec in rows[:MAX_FIXTURES]]
+
+
+def main():
+    rows = load_fixtures()
+    if not rows:
+        print(f"[ERROR] 没有超过 {MIN_FIXTURE_S}s 的样本: {FIXTURE_PATH}")
+        sys.exit(1)
+
+    model, device = wer.load_model(wer.BACKEND)
+    print(f"[INFO] 样本数: {len(rows)} device={device} backend={wer.BACKEND} "
+          f"chunk<={wer.CHUNK_MAX_S}s batch={wer.CHUNK_BATCH_SIZE}")
+
+    chunked, sequential = [], []
+    chunked_t = sequential_t = 0.0
+    n_chunks = 0
+    for rec in rows:
+        ref_text = rec["generated_text"].strip()
+        audio = wer.load_audio(rec["wav_path"])
+
+        t0 = time.perf_counter()
+        hyp, chunks = wer.transcribe_long(model, audio, device, row_id=rec.get("id"))
+        chunked_t += time.perf_counter() - t0
+        n_chunks += len(chunks)
+        chunked.append(compute_wer(ref_text, hyp))
+
+        t0 = time.perf_counter()
+        seq_hyp = wer.transcribe_sequential(model, rec["wav_path"])
+        sequential_t += time.perf_counter() - t0
+        sequential.append(compute_wer(ref_text, seq_hyp))
+        print(f"id={rec.get('id')} chunks={len(chunks)} chunked={chunked[-1]:.4f} sequential={sequential[-1]:.4f}")
+
+    deltas = [abs(a - b) for a, b in zip(chunked, sequential)]
+    report = {
+        "fixture_path": FIXTURE_PATH,
+        "n": len(deltas),
+        "chunks": n_chunks,
+        "chunked_avg": sum(chunked) / len(chunked),
+        "sequential_avg": sum(sequential) / len(sequential),
+        "mean_abs_delta": sum(deltas) / len(deltas),
+        "max_abs_delta": max(deltas),
+        "chunked_time_s": chunked_t,
+        "sequential_time_s": sequential_t,
+        "speedup": sequential_t / chunked_t if chunked_t > 0 else None,
+    }
+    report["pass"] = report["mean_abs_delta"] <= MAX_WER_DELTA
+    print(f"[WER] n={report['n']} chunks={n_chunks} avg sequential {report['sequential_avg']:.4f} -> "
+          f"chunked {report['chunked_avg']:.4f} mean|Δ|={report['mean_abs_delta']:.4f} "
+          f"max|Δ|={report['max_abs_delta']:.4f} time {sequential_t:.1f}s -> {chunked_t:.1f}s "
+          f"speedup={report['speedup']:.2f}x")
+
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[INFO] 写入完成: {OUTPUT_PATH}")
+    print("[PASS] 偏差在阈值内" if report["pass"] else "[FAIL] 偏差超过阈值")
+    if not report["pass"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,9 @@ Usage example:
         --test_data_name hlt-lab_voicebench_alpacaeval_test \
         --voice_prompt_id prompt-6
 
+    # 预测音频已用 audio_shard.py pack 打包时，wav_path 写成分片地址
+    ... --voice_prompt_id prompt-6 --shard_dir /root/autodl-tmp/evaluation/model_answer/model/<test_data_name>/pred_audio_shards/prompt-6
+
 """
 
 
@@ -25,6 +28,9 @@ import os
 import json
 import argparse
 
+import audio_shard
+from instrument import span
+
 def load_pred_text_map(pred_text_path):
     """
     pred_text 格式：
@@ -63,7 +69,7 @@ def load_pred_text_map(pred_text_path):
     return id2pred
 
 
-def main(base_path, ckpt_name, test_data_name, voice_prompt_id):
+def main(base_path, ckpt_name, test_data_name, voice_prompt_id, shard_dir=None):
     # ---------------- 路径 ----------------
     old_manifest = f"{base_path}/evaluation/voice_prompt/{test_data_name}/manifest.jsonl"
     pred_text_path = f"{base_path}/evaluation/model_answer/{ckpt_name}/{test_data_name}/pred_text"
@@ -75,6 +81,11 @@ def main(base_path, ckpt_name, test_data_name, voice_prompt_id):
     id2pred = load_pred_text_map(pred_text_path)
     print(f"[INFO] Loaded pred_text entries: {len(id2pred)}")
 
+    id2shard = None
+    if shard_dir:
+        id2shard = audio_shard.load_index(shard_dir)
+        print(f"[INFO] Loaded shard index entries: {len(id2shard)} ({shard_dir})")
+
     # ---------------- 读取旧 manifest.jsonl ----------------
     rows = []
     with open(old_manifest, "r", encoding="utf-8") as f:
@@ -87,7 +98,7 @@ def main(base_path, ckpt_name, test_data_name, voice_prompt_id):
     print(f"[INFO] Loaded manifest rows: {len(rows)}")
 
     # ---------------- 处理并生成 new manifest ----------------
-    with open(new_manifest, "w", encoding="utf-8") as fout:
+    with span("merge", "write") as sp, open(new_manifest, "w", encoding="utf-8") as fout:
         for row in rows:
             new_row = dict(row)  # 不修改原 row
 
@@ -97,13 +108,19 @@ def main(base_path, ckpt_name, test_data_name, voice_prompt_id):
             new_row["generated_text"] = pred_text
 
             # 更新 wav_path
-            new_row["wav_path"] = (
-                f"{base_path}/evaluation/model_answer/"
-                f"{ckpt_name}/{test_data_name}/pred_audio/"
-                f"{voice_prompt_id}/{row_id}.wav"
-            )
+            if id2shard is not None:
+                new_row["wav_path"] = id2shard.get(row_id)
+                if new_row["wav_path"] is None:
+                    print(f"[WARN] id={row_id} not found in shard index")
+            else:
+                new_row["wav_path"] = (
+                    f"{base_path}/evaluation/model_answer/"
+                    f"{ckpt_name}/{test_data_name}/pred_audio/"
+                    f"{voice_prompt_id}/{row_id}.wav"
+                )
 
             fout.write(json.dumps(new_row, ensure_ascii=False) + "\n")
+        sp.nbytes = fout.tell()
 
     print(f"[DONE] Written to: {new_manifest}")
 
@@ -114,7 +131,9 @@ if __name__ == "__main__":
     parser.add_argument("--ckpt_name", type=str, required=True)
     parser.add_argument("--test_data_name", type=str, required=True)
     parser.add_argument("--voice_prompt_id", type=str, required=True)
+    parser.add_argument("--shard_dir", type=str, default=None,
+                        help="audio_shard.py pack 输出目录；给定时 wav_path 写成分片地址")
 
     args = parser.parse_args()
 
-    main(args.base_path, args.ckpt_name, args.test_data_name, args.voice_prompt_id)
+    main(args.base_path, args.ckpt_name, args.test_data_name, args.voice_prompt_id, args.shard_dir)
@@ -1,7 +1,16 @@
 #!/usr/bin/env python
 # avg_metrics_fixed_path.py
+#
+#   python show_results.py                 # 一次性汇总
+#   python show_results.py --watch -i 10   # 评分进行中实时刷新（只解析新追加的行）
 
+import os
+import sys
+import glob
 import json
+import math
+import time
+import argparse
 
 # 支持批量展示多个数据集的 manifest_scored.jsonl
 INPUT_PATHS = [
@@ -22,6 +31,54 @@ WER_KEY = "wer"
 GPT_KEY = "chatgpt_score"
 UTMOS_KEY = "utmos_mos"
 
+# 延迟类字段（latency.py 写入），额外输出分位数
+LATENCY_KEYS = ["gen_time_s", "rtf", "first_chunk_latency_s", "llm_time_s"]
+PERCENTILES = [50, 90, 99]
+
+# 本地参考相似度（text_metrics.py 写入），额外输出与 GPT 分的 Spearman 秩相关
+TEXT_METRIC_KEYS = ["rouge_l", "chrf", "token_f1", "embed_cos"]
+
+
+def percentile(sorted_vals, q):
+    """线性插值分位数，sorted_vals 需已排序。"""
+    if not sorted_vals:
+        return None
+    k = (len(sorted_vals) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def ranks(vals):
+    """平均秩（并列取平均），从 1 开始。"""
+    order = sorted(range(len(vals)), key=vals.__getitem__)
+    r = [0.0] * len(vals)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and vals[order[j + 1]] == vals[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            r[order[k]] = (i + j) / 2.0 + 1
+        i = j + 1
+    return r
+
+
+def spearman(pairs):
+    """pairs: [(x, y)]；Spearman 秩相关 = 秩的 Pearson 相关，样本不足或方差为 0 时返回 None。"""
+    if len(pairs) < 3:
+        return None
+    rx = ranks([x for x, _ in pairs])
+    ry = ranks([y for _, y in pairs])
+    mx = sum(rx) / len(rx)
+    my = sum(ry) / len(ry)
+    cov = sum((a - mx) * (b - my) for a, b in zip(rx, ry))
+    vx = sum((a - mx) ** 2 for a in rx)
+    vy = sum((b - my) ** 2 for b in ry)
+    if vx == 0 or vy == 0:
+        return None
+    return cov / (vx * vy) ** 0.5
+
 
 def summarize_one(path: str):
     wer_sum = 0.0
@@ -30,6 +87,13 @@ def summarize_one(path: str):
     gpt_cnt = 0
     utmos_sum = 0.0
     utmos_cnt = 0
+    latency_vals = {k: [] for k in LATENCY_KEYS}
+    # audio_check.py 标记为 audio_ok=false 的行，评分脚本默认跳过（指标为 null），不计入平均
+    rows = 0
+    flagged = 0
+    skipped = {WER_KEY: 0, GPT_KEY: 0, UTMOS_KEY: 0}
+    text_vals = {k: [] for k in TEXT_METRIC_KEYS}
+    text_pairs = {k: [] for k in TEXT_METRIC_KEYS}
 
     try:
         with open(path, "r", encoding="utf-8") as f:
@@ -43,6 +107,13 @@ def summarize_one(path: str):
                     print(f"[WARN] {path} line {line_no} 不是合法 JSON，跳过")
                     continue
 
+                rows += 1
+                if item.get("audio_ok") is False:
+                    flagged += 1
+                    for k in skipped:
+                        if item.get(k) is None:
+                            skipped[k] += 1
+
                 # WER
                 v = item.get(WER_KEY)
                 if v is not None:
@@ -69,6 +140,33 @@ def summarize_one(path: str):
                         utmos_cnt += 1
                     except (TypeError, ValueError):
                         print(f"[WARN] {path} line {line_no} {UTMOS_KEY} 不是数值，跳过")
+
+                # 延迟
+                for k in LATENCY_KEYS:
+                    v = item.get(k)
+                    if v is not None:
+                        try:
+                            latency_vals[k].append(float(v))
+                        except (TypeError, ValueError):
+                            print(f"[WARN] {path} line {line_no} {k} 不是数值，跳过")
+
+                # 参考相似度（与 GPT 分成对收集，用于秩相关）
+                gpt = item.get(GPT_KEY)
+                for k in TEXT_METRIC_KEYS:
+                    v = item.get(k)
+                    if v is None:
+                        continue
+                    try:
+                        v = float(v)
+                    except (TypeError, ValueError):
+                        print(f"[WARN] {path} line {line_no} {k} 不是数值，跳过")
+                        continue
+                    text_vals[k].append(v)
+                    if gpt is not None:
+                        try:
+                            text_pairs[k].append((v, float(gpt)))
+                        except (TypeError, ValueError):
+                            pass
     except FileNotFoundError:
         print(f"[WARN] 文件不存在，跳过: {path}")
         return None
@@ -76,7 +174,29 @@ def summarize_one(path: str):
     def safe_avg(total, count):
         return total / count if count > 0 else None
 
+    latency = {}
+    for k, vals in latency_vals.items():
+        vals.sort()
+        stats = {"cnt": len(vals), "avg": safe_avg(sum(vals), len(vals))}
+        for q in PERCENTILES:
+            stats[f"p{q}"] = percentile(vals, q)
+        latency[k] = stats
+
+    text = {}
+    for k, vals in text_vals.items():
+        text[k] = {
+            "cnt": len(vals),
+            "avg": safe_avg(sum(vals), len(vals)),
+            "spearman_n": len(text_pairs[k]),
+            "spearman": spearman(text_pairs[k]),
+        }
+
     return {
+        "rows": rows,
+        "flagged": flagged,
+        "skipped": skipped,
+        "latency": latency,
+        "text": text,
         "wer_cnt": wer_cnt,
         "wer_avg": safe_avg(wer_sum, wer_cnt),
         "gpt_cnt": gpt_cnt,
@@ -86,6 +206,223 @@ def summarize_one(path: str):
     }
 
 
+# ===== watch 模式 =====
+# 评分脚本就地更新时先写临时文件，完成后 os.replace 到 manifest_scored.jsonl
+TMP_GLOBS = ["wer_tmp_*.jsonl", "textmetrics_tmp_*.jsonl", "gptscore_tmp_*.jsonl", "utmos_tmp_*.jsonl", "latency_tmp_*.jsonl"]
+# 分位数直方图的取值范围（超出范围的值计入两端的桶）
+SKETCH_RANGES = {WER_KEY: (0.0, 2.0), GPT_KEY: (0.0, 5.0), UTMOS_KEY: (1.0, 5.0)}
+SKETCH_BINS = 200
+# 取值为少数离散值的指标（GPT 分为整数）：按精确值计数，分位数取实际出现过的值
+DISCRETE_KEYS = {GPT_KEY}
+
+
+class HistogramSketch:
+    """固定范围等宽直方图：O(1) 插入，常数内存，分位数误差不超过一个桶宽。"""
+
+    def __init__(self, lo, hi, bins=SKETCH_BINS):
+        self.lo = lo
+        self.hi = hi
+        self.width = (hi - lo) / bins
+        self.counts = [0] * bins
+        self.n = 0
+
+    def add(self, v):
+        b = int((v - self.lo) / self.width)
+        self.counts[min(max(b, 0), len(self.counts) - 1)] += 1
+        self.n += 1
+
+    def quantile(self, q):
+        if not self.n:
+            return None
+        target = q * self.n
+        acc = 0
+        for b, c in enumerate(self.counts):
+            if c and acc + c >= target:
+                return self.lo + self.width * (b + (target - acc) / c)
+            acc += c
+        return self.hi
+
+
+class DiscreteSketch:
+    """离散取值计数，分位数取最近秩对应的实际值，不会出现 1.018 这类不存在的分数。"""
+
+    def __init__(self):
+        self.counts = {}
+        self.n = 0
+
+    def add(self, v):
+        self.counts[v] = self.counts.get(v, 0) + 1
+        self.n += 1
+
+    def quantile(self, q):
+        if not self.n:
+            return None
+        target = max(1, math.ceil(q * self.n))
+        acc = 0
+        for v in sorted(self.counts):
+            acc += self.counts[v]
+            if acc >= target:
+                return v
+        return v
+
+
+class MetricAcc:
+    def __init__(self):
+        self.rows = 0
+        self.sums = {k: 0.0 for k in SKETCH_RANGES}
+        self.cnts = {k: 0 for k in SKETCH_RANGES}
+        self.sketches = {k: DiscreteSketch() if k in DISCRETE_KEYS else HistogramSketch(*r)
+                         for k, r in SKETCH_RANGES.items()}
+
+    def add(self, item):
+        self.rows += 1
+        for k in SKETCH_RANGES:
+            v = item.get(k)
+            if v is None:
+                continue
+            try:
+                v = float(v)
+            except (TypeError, ValueError):
+                continue
+            self.sums[k] += v
+            self.cnts[k] += 1
+            self.sketches[k].add(v)
+
+
+class TailReader:
+    """记录字节偏移，每次只解析新追加的完整行；文件被替换或截断时从头重读。"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.inode = None
+        self.mtime = 0.0
+        self.acc = MetricAcc()
+
+    def poll(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            self.inode = st.st_ino
+            self.offset = 0
+            self.acc = MetricAcc()
+        self.mtime = st.st_mtime
+        if st.st_size == self.offset:
+            return True
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+        end = data.rfind(b"\n")
+        if end < 0:
+            return True  # 只有半行，等下次
+        self.offset += end + 1
+        for line in data[:end].split(b"\n"):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                self.acc.add(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return True
+
+
+class DatasetWatch:
+    def __init__(self, scored_path):
+        self.dir = os.path.dirname(scored_path)
+        self.model_name, self.dataset_name = pretty_label(scored_path)
+        self.readers = {scored_path: TailReader(scored_path)}
+        self.total = None
+        self._total_key = None
+        self.history = []  # [(time, rows)]，用于估算 ETA
+
+    def _count_total(self):
+        manifest = os.path.join(self.dir, "manifest.jsonl")
+        try:
+            st = os.stat(manifest)
+        except FileNotFoundError:
+            return
+        key = (st.st_ino, st.st_size, st.st_mtime)
+        if key != self._total_key:
+            with open(manifest, "rb") as f:
+                self.total = sum(1 for line in f if line.strip())
+            self._total_key = key
+
+    def poll(self, now):
+        self._count_total()
+        for pattern in TMP_GLOBS:
+            for p in glob.glob(os.path.join(self.dir, pattern)):
+                self.readers.setdefault(p, TailReader(p))
+        live = {}
+        for p, r in self.readers.items():
+            if r.poll():
+                live[p] = r
+        self.readers = live or self.readers
+
+        active = max(live.values(), key=lambda r: r.mtime) if live else None
+        rows = active.acc.rows if active else 0
+        if not self.history or self.history[-1][1] != rows:
+            if self.history and rows < self.history[-1][1]:
+                self.history = []  # 新阶段开始
+            self.history.append((now, rows))
+        return active
+
+    def metric(self, key, live):
+        """取最近修改且含该指标的文件的统计。"""
+        for r in sorted(live, key=lambda r: r.mtime, reverse=True):
+            if r.acc.cnts[key]:
+                acc = r.acc
+                return acc.sums[key] / acc.cnts[key], acc.sketches[key].quantile(0.5), acc.sketches[key].quantile(0.9)
+        return None
+
+    def eta(self, rows):
+        if self.total is None or len(self.history) < 2 or rows >= self.total:
+            return None
+        (t0, r0), (t1, r1) = self.history[0], self.history[-1]
+        if t1 <= t0 or r1 <= r0:
+            return None
+        return (self.total - rows) / ((r1 - r0) / (t1 - t0))
+
+
+def _fmt(v, spec=".3f"):
+    return "-" if v is None else format(v, spec)
+
+
+def render(watches, now):
+    lines = [f"===== Live Metrics ({time.strftime('%H:%M:%S', time.localtime(now))}) =====",
+             f"{'model':<12} {'dataset':<46} {'rows':>9} {'ETA':>7}  "
+             f"{'WER avg/p50/p90':<20} {'GPT avg/p50/p90':<20} {'UTMOS avg/p50/p90':<20}"]
+    for w in watches:
+        active = w.poll(now)
+        rows = active.acc.rows if active else 0
+        live = list(w.readers.values())
+        cells = []
+        for key in (WER_KEY, GPT_KEY, UTMOS_KEY):
+            m = w.metric(key, live)
+            cells.append("-" if m is None else "/".join(_fmt(v) for v in m))
+        eta = w.eta(rows)
+        progress = f"{rows}/{w.total if w.total is not None else '?'}"
+        lines.append(f"{w.model_name:<12} {w.dataset_name:<46} {progress:>9} "
+                     f"{('-' if eta is None else f'{eta:.0f}s'):>7}  "
+                     f"{cells[0]:<20} {cells[1]:<20} {cells[2]:<20}")
+    return "\n".join(lines)
+
+
+def watch(interval):
+    watches = [DatasetWatch(p) for p in INPUT_PATHS]
+    try:
+        while True:
+            out = render(watches, time.time())
+            # 清屏后重绘
+            sys.stdout.write("\033[2J\033[H" + out + "\n")
+            sys.stdout.flush()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
 def pretty_label(path: str):
     # 例：../model_answer/Tini-Omni/hlt-lab_voicebench_alpacaeval_test/manifest_scored.jsonl
     parts = path.strip("/").split("/")
@@ -108,10 +445,33 @@ def main():
         if not stats:
             continue
         print(f"\n[{model_name}] {dataset_name}")
-        print(f"WER   count = {stats['wer_cnt']},   avg = {stats['wer_avg']}")
-        print(f"GPT   count = {stats['gpt_cnt']},   avg = {stats['gpt_avg']}")
-        print(f"UTMOS count = {stats['utmos_cnt']}, avg = {stats['utmos_avg']}")
+        sk = stats["skipped"]
+        print(f"rows  = {stats['rows']}, audio flagged = {stats['flagged']}")
+        print(f"WER   count = {stats['wer_cnt']},   avg = {stats['wer_avg']},   flagged skipped = {sk[WER_KEY]}")
+        print(f"GPT   count = {stats['gpt_cnt']},   avg = {stats['gpt_avg']},   flagged skipped = {sk[GPT_KEY]}")
+        print(f"UTMOS count = {stats['utmos_cnt']}, avg = {stats['utmos_avg']}, flagged skipped = {sk[UTMOS_KEY]}")
+        if stats["flagged"]:
+            print(f"[WARN] {stats['flagged']} 行音频被 audio_check 标记，相关指标未计入平均（坏输出会抬高均值）")
+        for k, lat in stats["latency"].items():
+            if not lat["cnt"]:
+                continue
+            pct = "  ".join(f"p{q} = {lat[f'p{q}']:.3f}" for q in PERCENTILES)
+            print(f"{k:<22} count = {lat['cnt']}, avg = {lat['avg']:.3f}  {pct}")
+        for k, tm in stats["text"].items():
+            if not tm["cnt"]:
+                continue
+            rho = "-" if tm["spearman"] is None else f"{tm['spearman']:.3f}"
+            print(f"{k:<22} count = {tm['cnt']}, avg = {tm['avg']:.3f}  "
+                  f"spearman vs {GPT_KEY} = {rho} (n = {tm['spearman_n']})")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--watch", action="store_true", help="实时刷新评分进度与指标")
+    parser.add_argument("-i", "--interval", type=float, default=5.0, help="watch 刷新间隔（秒）")
+    args = parser.parse_args()
+
+    if args.watch:
+        watch(args.interval)
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+summarize_events.py
+
+汇总 instrument.py 写出的 EVAL_EVENTS 事件日志：
+  1) 分阶段耗时：每个 (stage, phase) 的次数、总耗时、占比、均值、p50/p90、字节吞吐
+  2) 吞吐时间线：按 --bucket_s 秒分桶，统计每个 stage 每桶完成的行数（按 id 去重）
+
+Usage:
+    python summarize_events.py /path/events.jsonl --bucket_s 30
+"""
+
+import json
+import argparse
+from collections import defaultdict
+
+
+def percentile(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    k = (len(sorted_vals) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def load_events(path):
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"[WARN] line {line_no} 不是合法 JSON，跳过")
+    return events
+
+
+def phase_breakdown(events):
+    durs = defaultdict(list)
+    nbytes = defaultdict(int)
+    for e in events:
+        key = (e.get("stage"), e.get("phase"))
+        durs[key].append(float(e.get("dur") or 0.0))
+        if e.get("bytes"):
+            nbytes[key] += int(e["bytes"])
+
+    stage_total = defaultdict(float)
+    for (stage, _), vals in durs.items():
+        stage_total[stage] += sum(vals)
+
+    rows = []
+    for (stage, phase), vals in sorted(durs.items(), key=lambda kv: (kv[0][0] or "", -sum(kv[1]))):
+        vals.sort()
+        total = sum(vals)
+        rows.append({
+            "stage": stage,
+            "phase": phase,
+            "count": len(vals),
+            "total_s": total,
+            "share": total / stage_total[stage] if stage_total[stage] > 0 else 0.0,
+            "mean_s": total / len(vals),
+            "p50_s": percentile(vals, 50),
+            "p90_s": percentile(vals, 90),
+            "mb_per_s": (nbytes[(stage, phase)] / 2**20) / total if total > 0 and nbytes[(stage, phase)] else None,
+        })
+    return rows
+
+
+def throughput_timeline(events, bucket_s):
+    """每个 stage 中，一个 id 的最后一个事件结束时刻视为该行完成。"""
+    done_at = {}
+    t0 = None
+    for e in events:
+        if e.get("start") is not None:
+            t0 = e["start"] if t0 is None else min(t0, e["start"])
+        if e.get("id") is None or e.get("end") is None:
+            continue
+        key = (e.get("stage"), e["id"])
+        done_at[key] = max(done_at.get(key, e["end"]), e["end"])
+
+    timeline = defaultdict(lambda: defaultdict(int))
+    for (stage, _), end in done_at.items():
+        timeline[stage][int((end - t0) // bucket_s)] += 1
+    return timeline
+
+
+def main(path, bucket_s):
+    events = load_events(path)
+    print(f"[INFO] 事件数: {len(events)}  ({path})")
+    if not events:
+        return
+
+    print("\n===== Phase Breakdown =====")
+    print(f"{'stage':<12} {'phase':<14} {'count':>7} {'total_s':>10} {'share':>7} {'mean_s':>9} {'p50_s':>9} {'p90_s':>9} {'MB/s':>8}")
+    for r in phase_breakdown(events):
+        mbps = f"{r['mb_per_s']:.2f}" if r["mb_per_s"] is not None else "-"
+        print(f"{str(r['stage']):<12} {str(r['phase']):<14} {r['count']:>7} {r['total_s']:>10.3f} {r['share']:>7.1%} "
+              f"{r['mean_s']:>9.4f} {r['p50_s']:>9.4f} {r['p90_s']:>9.4f} {mbps:>8}")
+
+    print(f"\n===== Throughput Timeline (rows / {bucket_s:g}s) =====")
+    for stage, buckets in sorted(throughput_timeline(events, bucket_s).items()):
+        print(f"\n[{stage}]")
+        for b in range(max(buckets) + 1):
+            n = buckets.get(b, 0)
+            print(f"  t={b * bucket_s:>8g}s  {n:>5}  {'#' * min(n, 60)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("events_path", type=str)
+    parser.add_argument("--bucket_s", type=float, default=30.0)
+    args = parser.parse_args()
+
+    main(args.events_path, args.bucket_s)
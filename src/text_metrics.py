@@ -0,0 +1,261 @@
+"""本地参考相似度指标：对整个 manifest 批量计算 generated_text 与 target_text 的相似度
+
+作为 chatgpt_score 的快速、无 API 调用的内容信号，写入以下列（target_text 为空的行置为 null）：
+  - rouge_l     基于最长公共子序列的 F1（词级，位并行 LCS）
+  - chrf        字符 n-gram F-score（n=1..6，beta=2，去空白，与 sacrebleu chrF 一致，取值 0~1）
+  - token_f1    词袋重合 F1（与 gpt_score.py 级联代理信号同一口径）
+  - embed_cos   句向量余弦相似度，仅在 EMBED_MODEL 非空且 sentence-transformers 可用时计算
+
+整个文件一次读入：先统一分词、把词映射为整数 id，再逐对计算；
+句向量对去重后的文本批量编码，结果按 (模型, 文本哈希) 缓存到 EMBED_CACHE_DIR，
+同一参考答案在不同模型 / checkpoint 之间只编码一次。
+"""
+
+import os
+import re
+import json
+import hashlib
+import tempfile
+from collections import Counter
+from typing import List, Optional
+import numpy as np
+
+from instrument import span, profiled
+
+INPUT_PATH = "../model_answer/SLAM-Omni/truthfulqa_truthful_qa_generation_validation/manifest_scored.jsonl"
+OUTPUT_PATH = "../model_answer/SLAM-Omni/truthfulqa_truthful_qa_generation_validation/manifest_scored.jsonl"
+
+PRED_KEY = "generated_text"
+REF_KEY = "target_text"
+TEXT_METRIC_KEYS = ["rouge_l", "chrf", "token_f1", "embed_cos"]
+
+CHRF_ORDER = 6
+CHRF_BETA = 2.0
+
+EMBED_MODEL = None         # 如 "sentence-transformers/all-MiniLM-L6-v2"；None 表示不算 embed_cos
+EMBED_BATCH_SIZE = 64
+# 缓存放在 model_answer/ 下，所有模型、数据集共用
+EMBED_CACHE_DIR = os.path.join(os.path.dirname(INPUT_PATH), "..", "..", ".embed_cache")
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+# ===== 分词与词级指标 =====
+def tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def token_f1(a, b) -> float:
+    if not len(a) or not len(b):
+        return 0.0
+    common = sum((Counter(a) & Counter(b)).values())
+    if common == 0:
+        return 0.0
+    p = common / len(a)
+    r = common / len(b)
+    return 2 * p * r / (p + r)
+
+
+def encode_tokens(texts: List[str]) -> List[np.ndarray]:
+    """一次性分词并把所有文本的词映射到共享的整数 id（np.unique 建词表）。"""
+    toks = [tokens(t) for t in texts]
+    lengths = np.fromiter((len(t) for t in toks), dtype=np.int64, count=len(toks))
+    flat = np.array([w for t in toks for w in t], dtype=object)
+    if flat.size == 0:
+        return [np.zeros(0, dtype=np.int64) for _ in texts]
+    _, ids = np.unique(flat, return_inverse=True)
+    return np.split(ids.astype(np.int64), np.cumsum(lengths)[:-1])
+
+
+def lcs_length(a: np.ndarray, b: np.ndarray) -> int:
+    """位并行 LCS（Hyyrö）：a 的每个位置占一位，按 b 逐词更新，O(len(b) · len(a)/字长)。"""
+    m = len(a)
+    if m == 0 or len(b) == 0:
+        return 0
+    match = {}
+    for i, w in enumerate(a.tolist()):
+        match[w] = match.get(w, 0) | (1 << i)
+    full = (1 << m) - 1
+    v = full
+    for w in b.tolist():
+        u = v & match.get(w, 0)
+        v = ((v + u) | (v - u)) & full
+    return m - bin(v).count("1")
+
+
+def rouge_l(a: np.ndarray, b: np.ndarray) -> float:
+    lcs = lcs_length(a, b)
+    if lcs == 0:
+        return 0.0
+    p = lcs / len(a)
+    r = lcs / len(b)
+    return 2 * p * r / (p + r)
+
+
+# ===== chrF =====
+def _char_ngrams(text: str):
+    s = "".join(text.split())
+    return [Counter(s[i:i + n] for i in range(len(s) - n + 1)) for n in range(1, CHRF_ORDER + 1)]
+
+
+def chrf(pred: str, ref: str, ref_ngrams=None) -> float:
+    """sacrebleu 口径：各阶 n-gram 的 precision / recall 先取平均，再算 F-beta。"""
+    hyp = _char_ngrams(pred)
+    ref_ngrams = ref_ngrams if ref_ngrams is not None else _char_ngrams(ref)
+    precs, recs = [], []
+    for h, r in zip(hyp, ref_ngrams):
+        h_total = sum(h.values())
+        r_total = sum(r.values())
+        if not h_total or not r_total:
+            continue
+        common = sum((h & r).values())
+        precs.append(common / h_total)
+        recs.append(common / r_total)
+    if not precs:
+        return 0.0
+    p = sum(precs) / len(precs)
+    r = sum(recs) / len(recs)
+    if p + r == 0:
+        return 0.0
+    b2 = CHRF_BETA ** 2
+    return (1 + b2) * p * r / (b2 * p + r)
+
+
+# ===== 句向量（可选） =====
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _cache_path():
+    return os.path.join(EMBED_CACHE_DIR, re.sub(r"[^\w.-]+", "_", EMBED_MODEL) + ".npz")
+
+
+def _load_cache():
+    path = _cache_path()
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as data:
+        return dict(zip(data["keys"].tolist(), data["vecs"]))
+
+
+def _save_cache(cache):
+    os.makedirs(EMBED_CACHE_DIR, exist_ok=True)
+    keys = sorted(cache)
+    fd, tmp_path = tempfile.mkstemp(prefix="embed_cache_", suffix=".npz", dir=EMBED_CACHE_DIR)
+    os.close(fd)
+    try:
+        np.savez(tmp_path, keys=np.array(keys), vecs=np.stack([cache[k] for k in keys]))
+        os.replace(tmp_path, _cache_path())
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def embed_texts(texts: List[str]) -> Optional[dict]:
+    """返回 {文本哈希: 归一化向量}；未配置或依赖缺失时返回 None。"""
+    if not EMBED_MODEL:
+        return None
+    cache = _load_cache()
+    todo = {}
+    for t in texts:
+        h = _text_hash(t)
+        if h not in cache:
+            todo[h] = t
+    print(f"[INFO] embed: {len(set(map(_text_hash, texts)))} unique texts, {len(todo)} not cached")
+    if todo:
+        try:
+            from sentence_transformers import SentenceTransformer
+            encoder = SentenceTransformer(EMBED_MODEL, device="cpu")
+        except Exception as e:
+            print(f"[WARN] 加载向量模型失败，跳过 embed_cos: {e}")
+            return None
+        with span("text_metrics", "embed", nbytes=sum(len(t.encode("utf-8")) for t in todo.values())):
+            vecs = encoder.encode(list(todo.values()), batch_size=EMBED_BATCH_SIZE,
+                                  normalize_embeddings=True, convert_to_numpy=True)
+        cache.update(zip(todo.keys(), vecs.astype(np.float32)))
+        _save_cache(cache)
+    return cache
+
+
+# ===== 主流程 =====
+def read_rows(path):
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except Exception:
+                continue
+    return rows
+
+
+@profiled("text_metrics")
+def compute(rows):
+    preds = [str(r.get(PRED_KEY) or "") for r in rows]
+    refs = [str(r.get(REF_KEY) or "") for r in rows]
+    has_ref = [bool(ref.strip()) for ref in refs]
+
+    with span("text_metrics", "tokenize"):
+        ids = encode_tokens(preds + refs)
+        pred_ids, ref_ids = ids[:len(rows)], ids[len(rows):]
+
+    embed_cache = None
+    if any(has_ref):
+        embed_cache = embed_texts([t for t, ok in zip(preds + refs, has_ref + has_ref) if ok])
+
+    ref_ngrams = {}
+    with span("text_metrics", "score", nbytes=sum(len(t) for t in preds + refs)):
+        for k, item in enumerate(rows):
+            if not has_ref[k]:
+                for key in TEXT_METRIC_KEYS:
+                    item[key] = None
+                continue
+            ref = refs[k]
+            if ref not in ref_ngrams:
+                ref_ngrams[ref] = _char_ngrams(ref)
+            item["rouge_l"] = rouge_l(pred_ids[k], ref_ids[k])
+            item["chrf"] = chrf(preds[k], ref, ref_ngrams[ref])
+            item["token_f1"] = token_f1(pred_ids[k].tolist(), ref_ids[k].tolist())
+            if embed_cache is not None:
+                va = embed_cache[_text_hash(preds[k])]
+                vb = embed_cache[_text_hash(ref)]
+                item["embed_cos"] = float(np.dot(va, vb))
+            else:
+                item["embed_cos"] = None
+    return rows
+
+
+def main():
+    rows = read_rows(INPUT_PATH)
+    compute(rows)
+    n_scored = sum(r.get("rouge_l") is not None for r in rows)
+    print(f"[INFO] {n_scored}/{len(rows)} 行有 {REF_KEY}，已计算 {', '.join(TEXT_METRIC_KEYS)}")
+    for key in TEXT_METRIC_KEYS:
+        vals = [r[key] for r in rows if r.get(key) is not None]
+        if vals:
+            print(f"[INFO] {key:<9} avg = {sum(vals) / len(vals):.4f}")
+
+    # 整体读入后再写，输入输出同路径时先写临时文件再替换
+    out_dir = os.path.dirname(os.path.abspath(OUTPUT_PATH)) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix="textmetrics_tmp_", suffix=".jsonl", dir=out_dir)
+    os.close(fd)
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as fout:
+            with span("text_metrics", "write") as s:
+                for item in rows:
+                    fout.write(json.dumps(item, ensure_ascii=False) + "\n")
+                s.nbytes = fout.tell()
+        os.replace(tmp_path, OUTPUT_PATH)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,10 @@ Features:
 
 Usage:
   python /root/pnz/SLAM-Omni/examples/s2s/scripts/evaluation/tts_from_test_jsonl.py truthfulqa_truthful_qa_generation_validation --max_duration_s 30
+
+  # 按 adaptive_eval.py plan 生成的分层顺序只合成前 80 条（已存在的 wav 直接复用）
+  python tts_from_test_jsonl.py truthfulqa_truthful_qa_generation_validation \
+      --order_file /root/autodl-tmp/evaluation/text_prompt/truthfulqa_truthful_qa_generation_validation.order.json --max_rows 80
 """
 
 import os
@@ -52,11 +56,15 @@ except Exception as e:
 import torch
 import soundfile as sf
 
+from instrument import span
+
 # ------------------ 字段映射 ------------------
 DATASET_FIELD_MAP = {
     "Jiann_STORAL_default_storal_en_test": {"source_key": "story", "target_key": "moral"},
     "truthfulqa_truthful_qa_generation_validation": {"source_key": "question", "target_key": "best_answer"},
     "hlt-lab_voicebench_commoneval_test": {"source_key": "question", "target_key": "best_answer"},
+    # 由 build_prompts_from_conversations.py 从多轮对话中抽取
+    "allenai_WildChat-1M_default_train_prompts": {"source_key": "question", "target_key": "reference"},
 }
 
 # ------------------ CosyVoice 调用 ------------------
@@ -81,8 +89,27 @@ def truncate_audio(audio_np, sample_rate, max_duration_s):
     return audio_np
 
 
+# ------------------ 按顺序文件选行 ------------------
+def iter_ordered_rows(input_jsonl, order_file, max_rows):
+    """按 order_file 中的 id 顺序产出 (id, item)，id 即 text_prompt 中的行号（从 1 开始）。"""
+    with open(order_file, "r", encoding="utf-8") as f:
+        order = json.load(f)["order"]
+    if max_rows is not None:
+        order = order[:max_rows]
+    wanted = set(order)
+    by_id = {}
+    with open(input_jsonl, "r", encoding="utf-8") as f:
+        for idx, line in enumerate(f, start=1):
+            if idx in wanted:
+                by_id[idx] = json.loads(line)
+    for idx in order:
+        if idx in by_id:
+            yield idx, by_id[idx]
+
+
 # ------------------ 主流程 ------------------
-def run_tts(test_name: str, cosyvoice_path: str, max_duration_s: float = 30.0):
+def run_tts(test_name: str, cosyvoice_path: str, max_duration_s: float = 30.0,
+            order_file: str = None, max_rows: int = None):
     input_jsonl = f"{TEXT_PROMPT_DIR}/{test_name}.jsonl"
     if not os.path.exists(input_jsonl):
         raise FileNotFoundError(input_jsonl)
@@ -104,41 +131,57 @@ def run_tts(test_name: str, cosyvoice_path: str, max_duration_s: float = 30.0):
     manifest_path = f"{output_dir}/manifest.jsonl"
     fout = open(manifest_path, "w", encoding="utf-8")
 
+    if max_rows is None:
+        max_rows = MAX_ROWS
+
+    def _rows():
+        if order_file:
+            yield from iter_ordered_rows(input_jsonl, order_file, max_rows)
+            return
+        with open(input_jsonl, "r", encoding="utf-8") as f:
+            for idx, line in enumerate(f, start=1):
+                # --- 控制最大行数 ---
+                if max_rows is not None and idx > max_rows:
+                    print(f"[INFO] 已达到 MAX_ROWS={max_rows}，停止提前退出。")
+                    break
+                yield idx, json.loads(line)
+
     # 读取文本
-    with open(input_jsonl, "r", encoding="utf-8") as f:
-        for idx, line in enumerate(f, start=1):
-            # --- 控制最大行数 ---
-            if MAX_ROWS is not None and idx > MAX_ROWS:
-                print(f"[INFO] 已达到 MAX_ROWS={MAX_ROWS}，停止提前退出。")
-                break
-            
-            item = json.loads(line)
-            text = item[source_key]
-            target_text = item.get(target_key) if target_key else None
-            wav_path = f"{output_dir}/{idx}.wav"
+    for n, (idx, item) in enumerate(_rows(), start=1):
+        text = item[source_key]
+        target_text = item.get(target_key) if target_key else None
+        wav_path = f"{output_dir}/{idx}.wav"
+
+        if order_file and os.path.exists(wav_path):
+            # 顺序模式下扩充样本时复用已合成的音频
+            duration = sf.info(wav_path).duration
+            print(f"[{n}/{max_rows}] Reuse existing {wav_path}")
+        else:
             # 打印进度
-            print(f"[{idx+1}/{MAX_ROWS}] Synthesizing text length {len(text)}")
+            print(f"[{n}/{max_rows}] Synthesizing text length {len(text)}")
             # --- generate ---
-            audio_np = run_cosyvoice(cosy, text, spk_id=DEFAULT_SPK)
+            with span("tts", "synthesize", id=idx):
+                audio_np = run_cosyvoice(cosy, text, spk_id=DEFAULT_SPK)
 
             # --- truncate ---
             audio_np = truncate_audio(audio_np, SAMPLE_RATE, max_duration_s)
 
             # write wav
-            sf.write(wav_path, audio_np, SAMPLE_RATE)
+            with span("tts", "write_wav", id=idx, nbytes=audio_np.nbytes):
+                sf.write(wav_path, audio_np, SAMPLE_RATE)
 
             # duration
             duration = len(audio_np) / SAMPLE_RATE
 
-            # manifest
-            fout.write(json.dumps({
-                "id": idx,
-                "key": os.path.basename(wav_path), 
-                "source_wav": wav_path,
-                "source_text": text,
-                "target_text": target_text,
-                "duration": duration,
-            }, ensure_ascii=False) + "\n")
+        # manifest
+        fout.write(json.dumps({
+            "id": idx,
+            "key": os.path.basename(wav_path), 
+            "source_wav": wav_path,
+            "source_text": text,
+            "target_text": target_text,
+            "duration": duration,
+        }, ensure_ascii=False) + "\n")
 
     fout.close()
     print(f"[DONE] Saved to {output_dir}")
@@ -150,7 +193,9 @@ if __name__ == "__main__":
     parser.add_argument("test_name", type=str)
     parser.add_argument("--cosyvoice_path", type=str, default=DEFAULT_COSYVOICE_PATH)
     parser.add_argument("--max_duration_s", type=float, default=30.0)
+    parser.add_argument("--order_file", type=str, default=None, help="adaptive_eval.py plan 生成的 .order.json")
+    parser.add_argument("--max_rows", type=int, default=None, help="覆盖 MAX_ROWS")
 
     args = parser.parse_args()
 
-    run_tts(args.test_name, args.cosyvoice_path, args.max_duration_s)
+    run_tts(args.test_name, args.cosyvoice_path, args.max_duration_s, args.order_file, args.max_rows)
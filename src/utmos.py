@@ -1,15 +1,107 @@
 import json
 import os
+import time
+import wave
 import tempfile
 import shutil
+import torch
 import utmosv2
 
+import audio_shard
+from instrument import span, profiled, enabled as events_enabled
+
 # ===== 路径自己改 =====
 INPUT_PATH = "../model_answer/SLAM-Omni/hlt-lab_voicebench_alpacaeval_test/manifest_scored.jsonl"
 OUTPUT_PATH = "../model_answer/SLAM-Omni/hlt-lab_voicebench_alpacaeval_test/manifest_scored.jsonl"
 
-# 创建 UTMOS 模型（用 GPU）
-model = utmosv2.create_model(pretrained=True, device="cuda")
+# ===== 推理后端 =====
+# "fp32": GPU 可用时走 GPU，否则 CPU fp32
+# "int8": CPU 上对 Linear 层做动态 int8 量化（与 fp32 的偏差用 backend_drift.py 检查）
+BACKEND = "fp32"
+INTRA_OP_THREADS = None  # torch.set_num_threads，None 为默认
+INTER_OP_THREADS = None  # torch.set_num_interop_threads，None 为默认
+WARMUP_S = 2.0           # 预热音频长度（秒），0 表示不预热
+
+SKIP_FLAGGED_AUDIO = True  # 跳过 audio_check.py 标记为 audio_ok=false 的行
+
+model = None
+DEVICE = None
+
+
+def load_model(backend=BACKEND, device=None):
+    """按后端创建 UTMOS 模型并预热，设置模块级 model / DEVICE。fp32 下 device=None 表示自动选择。"""
+    global model, DEVICE
+    if INTRA_OP_THREADS:
+        torch.set_num_threads(INTRA_OP_THREADS)
+    if INTER_OP_THREADS:
+        try:
+            torch.set_num_interop_threads(INTER_OP_THREADS)
+        except RuntimeError as e:
+            print(f"[WARN] 设置 inter-op 线程数失败: {e}")
+
+    if backend == "int8":
+        DEVICE = "cpu"
+        model = utmosv2.create_model(pretrained=True, device=DEVICE)
+        _quantize_int8(model)
+    elif backend == "fp32":
+        DEVICE = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        model = utmosv2.create_model(pretrained=True, device=DEVICE)
+    else:
+        raise ValueError(f"未知 BACKEND: {backend}")
+    for m in ([model] if isinstance(model, torch.nn.Module) else getattr(model, "__dict__", {}).values()):
+        if isinstance(m, torch.nn.Module):
+            m.eval()
+
+    if WARMUP_S:
+        _warmup()
+    print(f"[INFO] UTMOS backend={backend} device={DEVICE}")
+    return model
+
+
+def _quantize_int8(m):
+    """对模型（或其包装对象持有的 nn.Module 属性）的 Linear 层就地做动态 int8 量化。
+
+    找不到可量化的模块时直接报错，避免 int8 后端实际仍以 fp32 运行、drift 检查结果失真。
+    """
+    if isinstance(m, torch.nn.Module):
+        targets = [m]
+    else:
+        targets = [v for v in getattr(m, "__dict__", {}).values() if isinstance(v, torch.nn.Module)]
+    if not targets:
+        raise RuntimeError(f"{type(m).__name__} 中找不到 nn.Module，无法使用 int8 后端")
+    # quantize_dynamic 只替换类型恰为 nn.Linear 的模块（子类不会被量化），所以按量化后的结果计数
+    n_quantized = 0
+    n_skipped = 0
+    for t in targets:
+        torch.quantization.quantize_dynamic(t, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        for x in t.modules():
+            if isinstance(x, torch.ao.nn.quantized.dynamic.Linear):
+                n_quantized += 1
+            elif isinstance(x, torch.nn.Linear):
+                n_skipped += 1
+    if n_quantized == 0:
+        raise RuntimeError(f"{type(m).__name__} 中没有被量化的 Linear 层，int8 量化不会生效")
+    print(f"[INFO] int8 动态量化 {n_quantized} 个 Linear 层" + (f"，{n_skipped} 个 Linear 子类未量化" if n_skipped else ""))
+
+
+def _warmup():
+    # 写一段低幅噪声 wav 走一遍完整 predict 流程
+    fd, tmp_wav = tempfile.mkstemp(prefix="utmos_warmup_", suffix=".wav")
+    os.close(fd)
+    try:
+        sr = 16000
+        n = int(WARMUP_S * sr)
+        samples = bytes((i * 7919) % 64 for i in range(n * 2))
+        with wave.open(tmp_wav, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(sr)
+            w.writeframes(samples)
+        t0 = time.perf_counter()
+        get_mos_for_wav(tmp_wav)
+        print(f"[INFO] UTMOS 预热完成 {time.perf_counter() - t0:.2f}s")
+    finally:
+        os.remove(tmp_wav)
 
 def get_mos_for_wav(wav_path: str):
     """
@@ -17,7 +109,10 @@ def get_mos_for_wav(wav_path: str):
     这里假设 model.predict(input_path=...) 返回一个 float 或长度为 1 的 list。
     如果你之前跑过可以根据实际再微调。
     """
-    mos = model.predict(input_path=wav_path)
+    if audio_shard.is_shard_path(wav_path):
+        mos = _predict_shard(wav_path)
+    else:
+        mos = model.predict(input_path=wav_path, device=DEVICE)
 
     # 兼容几种可能的返回类型
     if isinstance(mos, (list, tuple)):
@@ -28,7 +123,29 @@ def get_mos_for_wav(wav_path: str):
 
     return float(mos)
 
+def _predict_shard(wav_path):
+    """分片音频解码为 16kHz 波形后直接送入模型；旧版 utmosv2 不支持 data= 时落临时 wav。"""
+    sr = 16000
+    audio = audio_shard.load_audio(wav_path, sr)
+    try:
+        return model.predict(data=torch.from_numpy(audio), sr=sr, device=DEVICE)
+    except TypeError:
+        fd, tmp_wav = tempfile.mkstemp(prefix="utmos_shard_", suffix=".wav")
+        os.close(fd)
+        try:
+            with wave.open(tmp_wav, "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(sr)
+                w.writeframes((audio.clip(-1.0, 1.0) * 32767.0).astype("<i2").tobytes())
+            return model.predict(input_path=tmp_wav, device=DEVICE)
+        finally:
+            os.remove(tmp_wav)
+
+
+@profiled("utmos")
 def _process_stream(fin, fout):
+    # 逐行 flush，show_results.py --watch 可按行看到进度
     for line in fin:
         line = line.strip()
         if not line:
@@ -39,27 +156,44 @@ def _process_stream(fin, fout):
             continue
 
         wav_path = item.get("wav_path")
-        if not wav_path or not os.path.exists(wav_path):
+        if not audio_shard.audio_exists(wav_path):
             item["utmos_mos"] = None
             fout.write(json.dumps(item, ensure_ascii=False) + "\n")
+            fout.flush()
             print(f"id={item.get('id')}  wav={wav_path}  MOS=None (missing)")
             continue
 
+        if SKIP_FLAGGED_AUDIO and item.get("audio_ok") is False:
+            item["utmos_mos"] = None
+            fout.write(json.dumps(item, ensure_ascii=False) + "\n")
+            fout.flush()
+            print(f"id={item.get('id')}  wav={wav_path}  MOS=None (flagged: {item.get('audio_flags')})")
+            continue
+
         try:
-            mos_score = get_mos_for_wav(wav_path)
+            # 事件关闭时不额外 stat 音频文件
+            nbytes = audio_shard.audio_nbytes(wav_path) if events_enabled() else None
+            with span("utmos", "forward", id=item.get("id"), nbytes=nbytes, device=DEVICE):
+                mos_score = get_mos_for_wav(wav_path)
         except Exception as e:
             item["utmos_mos"] = None
             item["error_utmos"] = f"{type(e).__name__}: {str(e)[:200]}"
             fout.write(json.dumps(item, ensure_ascii=False) + "\n")
+            fout.flush()
             print(f"id={item.get('id')}  wav={wav_path}  MOS=None (error)")
             continue
 
         item["utmos_mos"] = mos_score
-        fout.write(json.dumps(item, ensure_ascii=False) + "\n")
+        with span("utmos", "serialize", id=item.get("id")):
+            out = json.dumps(item, ensure_ascii=False) + "\n"
+        with span("utmos", "write", id=item.get("id"), nbytes=len(out)):
+            fout.write(out)
+            fout.flush()
         print(f"id={item.get('id')}  wav={wav_path}  MOS={mos_score:.3f}")
 
 
 def main():
+    load_model(BACKEND)
     same_path = os.path.abspath(INPUT_PATH) == os.path.abspath(OUTPUT_PATH)
 
     if same_path:
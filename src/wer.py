@@ -6,19 +6,54 @@
 
 输出：在原字段基础上追加键 "wer" 写入 manifest_scored.jsonl。
 如果转写或文件缺失则 wer 置为 null。
+
+长音频模式（LONG_AUDIO=True）：
+  超过 CHUNK_MAX_S 的音频在能量最低的静音处切成不超过 30s 的片段，
+  所有片段一次性批量解码后按顺序拼接，并在 asr_chunks 中记录每段的起止时间与文本，
+  以及所在批次的整批耗时（batch_mel_s / batch_decode_s）。
+  COMPARE_SEQUENTIAL=True 时同时跑一遍 model.transcribe，写入 wer_sequential 便于核对；
+  固定样本上的离线核对用 long_audio_drift.py。
+
+CPU 推理后端（BACKEND）：
+  "fp32"  原始模型（GPU 可用时走 GPU）
+  "int8"  CPU 上对 Linear 层做动态 int8 量化；加载后先做一次预热。
+  线程数由 INTRA_OP_THREADS / INTER_OP_THREADS 控制。与 fp32 的指标偏差用 backend_drift.py 检查。
 """
 
 import os
 import json
+import time
+import tempfile
+import numpy as np
 import torch
 import whisper
 from jiwer import wer
 
+import audio_shard
+from instrument import span, profile_block, enabled as events_enabled
+
 INPUT_PATH = "/root/autodl-tmp/evaluation/model_answer/model/hlt-lab_voicebench_alpacaeval_test/manifest.jsonl"
 OUTPUT_PATH = "/root/autodl-tmp/evaluation/model_answer/model/hlt-lab_voicebench_alpacaeval_test/manifest_scored.jsonl"
 WHISPER_MODEL = "/root/autodl-tmp/whisper/small.pt"  # 可换成 "small" 等名称
 LANGUAGE = "en"  # 若希望自动检测可设为 None
 
+# ===== 长音频分段批量转写 =====
+LONG_AUDIO = False          # True: 按静音切段后批量解码
+COMPARE_SEQUENTIAL = False  # True: 额外跑顺序 transcribe 并记录 wer_sequential（仅用于核对，耗时翻倍）
+CHUNK_MAX_S = 30.0          # 每段最长秒数（Whisper 窗口为 30s）
+CHUNK_MIN_S = 10.0          # 切点搜索区间的下限，避免切出过短的片段
+FRAME_MS = 20               # 能量帧长（毫秒）
+SILENCE_DB = -40.0          # 相对峰值低于该分贝的帧视为静音
+CHUNK_BATCH_SIZE = 16       # 单次送入 decode 的最大片段数
+
+# ===== 推理后端 =====
+BACKEND = "fp32"            # "fp32" 或 "int8"（int8 强制使用 CPU）
+INTRA_OP_THREADS = None     # torch.set_num_threads，None 为默认
+INTER_OP_THREADS = None     # torch.set_num_interop_threads，None 为默认
+WARMUP_S = 2.0              # 预热音频长度（秒），0 表示不预热
+
+SKIP_FLAGGED_AUDIO = True   # 跳过 audio_check.py 标记为 audio_ok=false 的行
+
 def iter_jsonl(path):
     with open(path, 'r', encoding='utf-8') as f:
         for line_no, line in enumerate(f, 1):
@@ -32,70 +67,261 @@ def iter_jsonl(path):
                 continue
             yield line_no, obj
 
+def set_cpu_threads():
+    if INTRA_OP_THREADS:
+        torch.set_num_threads(INTRA_OP_THREADS)
+    if INTER_OP_THREADS:
+        try:
+            torch.set_num_interop_threads(INTER_OP_THREADS)
+        except RuntimeError as e:
+            # 并行任务启动后不允许再修改
+            print(f"[WARN] 设置 inter-op 线程数失败: {e}")
+
+
+def load_model(backend=BACKEND, device=None):
+    """按后端加载 Whisper，返回 (model, device)。fp32 下 device=None 表示自动选择。"""
+    set_cpu_threads()
+    if backend == "int8":
+        device = "cpu"
+        model = whisper.load_model(WHISPER_MODEL, device=device)
+        # whisper.model.Linear 在 fp32 下与 nn.Linear 等价（只做 dtype 转换），
+        # 而 quantize_dynamic 只识别精确类型，这里先还原为 nn.Linear 再量化
+        for m in model.modules():
+            if isinstance(m, torch.nn.Linear):
+                m.__class__ = torch.nn.Linear
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    elif backend == "fp32":
+        device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        model = whisper.load_model(WHISPER_MODEL, device=device)
+    else:
+        raise ValueError(f"未知 BACKEND: {backend}")
+    model.eval()
+
+    if WARMUP_S:
+        t0 = time.perf_counter()
+        audio = np.zeros(int(WARMUP_S * whisper.audio.SAMPLE_RATE), dtype=np.float32)
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=model.dims.n_mels).to(model.device)
+        whisper.decode(model, mel, whisper.DecodingOptions(language=LANGUAGE, without_timestamps=True, fp16=(device == "cuda")))
+        print(f"[INFO] 预热完成 backend={backend} {time.perf_counter() - t0:.2f}s")
+    return model, device
+
+
+def split_on_silence(audio, sr=whisper.audio.SAMPLE_RATE):
+    """返回 [(start, end), ...] 采样点区间，每段不超过 CHUNK_MAX_S。
+
+    帧能量用 reshape 一次算完；在 [start+CHUNK_MIN_S, start+CHUNK_MAX_S] 内
+    优先选最靠后的静音帧作为切点，没有静音帧则退化为能量最低的帧。
+    """
+    n = audio.shape[0]
+    max_len = int(CHUNK_MAX_S * sr)
+    if n <= max_len:
+        return [(0, n)]
+
+    frame = max(1, int(sr * FRAME_MS / 1000))
+    n_frames = n // frame
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-12)
+    db = 20.0 * np.log10(rms / (rms.max() + 1e-12))
+    silent = db < SILENCE_DB
+
+    min_frames = int(CHUNK_MIN_S * sr) // frame
+    max_frames = max_len // frame
+    spans = []
+    start_f = 0
+    while (n - start_f * frame) > max_len:
+        lo = start_f + min_frames
+        hi = min(start_f + max_frames, n_frames)
+        cand = np.nonzero(silent[lo:hi])[0]
+        if cand.size:
+            cut = lo + int(cand[-1])
+        else:
+            cut = lo + int(np.argmin(rms[lo:hi]))
+        cut = max(cut, start_f + 1)
+        spans.append((start_f * frame, cut * frame))
+        start_f = cut
+    spans.append((start_f * frame, n))
+    return spans
+
+
+def transcribe_long(model, audio, device, row_id=None):
+    """切段 -> 批量 decode -> 拼接。返回 (hyp, chunks)。"""
+    sr = whisper.audio.SAMPLE_RATE
+    spans = split_on_silence(audio, sr)
+    options = whisper.DecodingOptions(
+        language=LANGUAGE,
+        without_timestamps=True,
+        fp16=(device == "cuda"),
+    )
+
+    chunks = []
+    for b in range(0, len(spans), CHUNK_BATCH_SIZE):
+        batch = spans[b:b + CHUNK_BATCH_SIZE]
+        t0 = time.perf_counter()
+        with span("wer", "mel", id=row_id, device=device):
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(
+                    whisper.pad_or_trim(audio[s:e]), n_mels=model.dims.n_mels
+                )
+                for s, e in batch
+            ]).to(model.device)
+        t1 = time.perf_counter()
+        with span("wer", "forward", id=row_id, device=device):
+            results = whisper.decode(model, mels, options)
+        t2 = time.perf_counter()
+        for (s, e), res in zip(batch, results):
+            chunks.append({
+                "start_s": round(s / sr, 3),
+                "end_s": round(e / sr, 3),
+                "text": res.text.strip(),
+                "batch": b // CHUNK_BATCH_SIZE,
+                # 整批耗时（同批各段相同），不是单段耗时
+                "batch_size": len(batch),
+                "batch_mel_s": round(t1 - t0, 4),
+                "batch_decode_s": round(t2 - t1, 4),
+            })
+
+    hyp = " ".join(c["text"] for c in chunks if c["text"]).strip()
+    return hyp, chunks
+
+
+def load_audio(wav_path):
+    """16kHz float32 音频；支持 audio_shard 分片地址。"""
+    if audio_shard.is_shard_path(wav_path):
+        return audio_shard.load_audio(wav_path, whisper.audio.SAMPLE_RATE)
+    return whisper.load_audio(wav_path)
+
+
+def transcribe_sequential(model, wav_path):
+    fp16 = model.device.type == "cuda"
+    # transcribe 可直接接受文件路径；分片地址需先解码为数组
+    audio = load_audio(wav_path) if audio_shard.is_shard_path(wav_path) else wav_path
+    if LANGUAGE:
+        tr = model.transcribe(audio, language=LANGUAGE, fp16=fp16)
+    else:
+        tr = model.transcribe(audio, fp16=fp16)
+    return (tr.get('text') or '').strip()
+
+
 def main():
     print(f"[INFO] 输入清单: {INPUT_PATH}")
     if not os.path.exists(INPUT_PATH):
         raise FileNotFoundError(f"输入文件不存在: {INPUT_PATH}")
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"[INFO] 使用设备: {device}")
-    model = whisper.load_model(WHISPER_MODEL, device=device)
+    model, device = load_model(BACKEND)
+    print(f"[INFO] 使用设备: {device} backend={BACKEND}")
+    if LONG_AUDIO:
+        print(f"[INFO] 长音频模式: chunk<={CHUNK_MAX_S}s batch={CHUNK_BATCH_SIZE} compare_sequential={COMPARE_SEQUENTIAL}")
 
     total=0
     done=0
     wers=[]
-    results=[]
+    seq_wers=[]
+
+    # 每行打完分立即写出并 flush（show_results.py --watch 可实时看到进度）；
+    # 输入输出同路径时先写同目录临时文件，结束后原子替换
+    out_dir = os.path.dirname(os.path.abspath(OUTPUT_PATH)) or "."
+    os.makedirs(out_dir, exist_ok=True)
+    same_path = os.path.abspath(INPUT_PATH) == os.path.abspath(OUTPUT_PATH)
+    if same_path:
+        fd, write_path = tempfile.mkstemp(prefix="wer_tmp_", suffix=".jsonl", dir=out_dir)
+        os.close(fd)
+    else:
+        write_path = OUTPUT_PATH
 
     # 正式遍历
-    for line_no, rec in iter_jsonl(INPUT_PATH):
-        total += 1
-        wav_path = rec.get('wav_path')
-        ref_text = rec.get('generated_text')  # 参考文本选择生成文本
-        if not wav_path or not os.path.exists(wav_path):
-            ap = os.path.abspath(wav_path) if wav_path else None
-            print(f"[WARN] line={line_no} id={rec.get('id')} 缺少或找不到音频: raw='{wav_path}' abs='{ap}' exists={os.path.exists(ap) if ap else False}")
-            rec['wer'] = None
-            results.append(rec)
-            continue
-        if not isinstance(ref_text, str) or not ref_text.strip():
-            print(f"[WARN] line={line_no} id={rec.get('id')} 参考文本为空")
-            rec['wer'] = None
-            results.append(rec)
-            continue
-        # 转写
-        try:
-            if LANGUAGE:
-                tr = model.transcribe(wav_path, language=LANGUAGE)
-            else:
-                tr = model.transcribe(wav_path)
-            hyp = (tr.get('text') or '').strip()
-        except Exception as e:
-            print(f"[ERROR] line={line_no} id={rec.get('id')} 转写失败: {e}")
-            rec['wer'] = None
-            results.append(rec)
-            continue
-        # WER
-        try:
-            score = wer(ref_text.strip(), hyp)
-            rec['wer'] = score
-            wers.append(score)
-            done += 1
-            print(f"[OK] id={rec.get('id')} WER={score:.4f}")
-        except Exception as e:
-            print(f"[ERROR] line={line_no} id={rec.get('id')} 计算 WER 失败: {e}")
-            rec['wer'] = None
-        results.append(rec)
+    try:
+        with profile_block("wer"), open(write_path, 'w', encoding='utf-8') as fout:
+            def write_row(rec):
+                with span("wer", "write", id=rec.get('id')) as sp:
+                    out = json.dumps(rec, ensure_ascii=False) + '\n'
+                    fout.write(out)
+                    fout.flush()
+                    sp.nbytes = len(out)
+
+            for line_no, rec in iter_jsonl(INPUT_PATH):
+                total += 1
+                wav_path = rec.get('wav_path')
+                ref_text = rec.get('generated_text')  # 参考文本选择生成文本
+                if not audio_shard.audio_exists(wav_path):
+                    ap = os.path.abspath(wav_path) if wav_path else None
+                    print(f"[WARN] line={line_no} id={rec.get('id')} 缺少或找不到音频: raw='{wav_path}' abs='{ap}' exists={os.path.exists(ap) if ap else False}")
+                    rec['wer'] = None
+                    write_row(rec)
+                    continue
+                if SKIP_FLAGGED_AUDIO and rec.get('audio_ok') is False:
+                    print(f"[SKIP] line={line_no} id={rec.get('id')} 音频未通过检查: {rec.get('audio_flags')}")
+                    rec['wer'] = None
+                    write_row(rec)
+                    continue
+                if not isinstance(ref_text, str) or not ref_text.strip():
+                    print(f"[WARN] line={line_no} id={rec.get('id')} 参考文本为空")
+                    rec['wer'] = None
+                    write_row(rec)
+                    continue
+                # 转写
+                try:
+                    t0 = time.perf_counter()
+                    # 事件关闭时不额外 stat 音频文件
+                    nbytes = audio_shard.audio_nbytes(wav_path) if events_enabled() else None
+                    if LONG_AUDIO:
+                        with span("wer", "decode_audio", id=rec.get('id'), nbytes=nbytes):
+                            audio = load_audio(wav_path)
+                        hyp, chunks = transcribe_long(model, audio, device, row_id=rec.get('id'))
+                        rec['asr_chunks'] = chunks
+                    else:
+                        # transcribe 内部包含音频解码与前向，整体记为 transcribe
+                        with span("wer", "transcribe", id=rec.get('id'), nbytes=nbytes, device=device):
+                            hyp = transcribe_sequential(model, wav_path)
+                    rec['asr_time_s'] = round(time.perf_counter() - t0, 4)
+                except Exception as e:
+                    print(f"[ERROR] line={line_no} id={rec.get('id')} 转写失败: {e}")
+                    rec['wer'] = None
+                    write_row(rec)
+                    continue
+                # WER
+                try:
+                    with span("wer", "metric", id=rec.get('id')):
+                        score = wer(ref_text.strip(), hyp)
+                    rec['wer'] = score
+                    wers.append(score)
+                    done += 1
+                    print(f"[OK] id={rec.get('id')} WER={score:.4f}")
+                except Exception as e:
+                    print(f"[ERROR] line={line_no} id={rec.get('id')} 计算 WER 失败: {e}")
+                    rec['wer'] = None
+                # 与顺序转写核对
+                if LONG_AUDIO and COMPARE_SEQUENTIAL and rec.get('wer') is not None:
+                    try:
+                        t0 = time.perf_counter()
+                        seq_hyp = transcribe_sequential(model, wav_path)
+                        rec['asr_time_sequential_s'] = round(time.perf_counter() - t0, 4)
+                        rec['wer_sequential'] = wer(ref_text.strip(), seq_hyp)
+                        seq_wers.append((rec['wer'], rec['wer_sequential']))
+                        print(f"[CMP] id={rec.get('id')} chunked={rec['wer']:.4f} sequential={rec['wer_sequential']:.4f} "
+                              f"time {rec['asr_time_s']:.2f}s vs {rec['asr_time_sequential_s']:.2f}s")
+                    except Exception as e:
+                        print(f"[ERROR] line={line_no} id={rec.get('id')} 顺序转写核对失败: {e}")
+                write_row(rec)
+
+        if same_path:
+            os.replace(write_path, OUTPUT_PATH)
+    finally:
+        if same_path and os.path.exists(write_path):
+            try:
+                os.remove(write_path)
+            except Exception:
+                pass
 
     if wers:
         print(f"\n[SUMMARY] 成功 {done}/{total} 平均 WER={sum(wers)/len(wers):.4f}")
     else:
         print(f"\n[SUMMARY] 无成功样本。total={total}")
+    if seq_wers:
+        chunked_avg = sum(a for a, _ in seq_wers) / len(seq_wers)
+        seq_avg = sum(b for _, b in seq_wers) / len(seq_wers)
+        print(f"[SUMMARY] 分段 vs 顺序: n={len(seq_wers)} 平均 WER {chunked_avg:.4f} vs {seq_avg:.4f} "
+              f"(delta={chunked_avg - seq_avg:+.4f})")
 
-    out_dir = os.path.dirname(OUTPUT_PATH)
-    os.makedirs(out_dir, exist_ok=True)
-    with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
-        for rec in results:
-            f.write(json.dumps(rec, ensure_ascii=False) + '\n')
     print(f"[INFO] 写入完成: {OUTPUT_PATH}")
 
 if __name__ == '__main__':